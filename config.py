@@ -1,3 +1,4 @@
+import json
 import os
 import pytz
 from dotenv import load_dotenv
@@ -6,13 +7,57 @@ load_dotenv()
 
 # Bot configuration settings
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Public base URL of this service; when set, bot updates arrive by webhook instead of polling
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '').rstrip('/')
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram/webhook')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')  # Random per start if unset
 API_ID = os.getenv('API_ID')
 API_HASH = os.getenv('API_HASH')
 TELEGRAM_SESSION_STRING = os.getenv('TELEGRAM_SESSION_STRING')
 TWITTER_VID_BOT = os.getenv('TWITTER_VID_BOT', 'twittervid_bot')
+TELEGRAM_SESSION_BACKEND = os.getenv('TELEGRAM_SESSION_BACKEND', 'string')  # string or sqlite
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+TELEGRAM_SESSION_FILE = os.getenv('TELEGRAM_SESSION_FILE', os.path.join(DATA_DIR, 'userbot'))
+MEDIA_TEMP_DIR = os.getenv('MEDIA_TEMP_DIR', os.path.join(DATA_DIR, 'tmp'))
+MEDIA_TEMP_QUOTA_MB = int(os.getenv('MEDIA_TEMP_QUOTA_MB', '1024'))
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', os.path.join(DATA_DIR, 'media_cache'))
+MEDIA_CACHE_MB = int(os.getenv('MEDIA_CACHE_MB', '2048'))
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', str(os.cpu_count() or 1)))  # ffmpeg processes
+TRANSCODE_QUEUE_SIZE = int(os.getenv('TRANSCODE_QUEUE_SIZE', '32'))
+TRANSCODE_CACHE_DIR = os.getenv('TRANSCODE_CACHE_DIR', os.path.join(DATA_DIR, 'transcoded'))
+TRANSCODE_CACHE_MB = int(os.getenv('TRANSCODE_CACHE_MB', '2048'))
+VIDEO_THUMB_DIR = os.getenv('VIDEO_THUMB_DIR', os.path.join(DATA_DIR, 'thumbs'))
+USERBOT_RATE = float(os.getenv('USERBOT_RATE', '5'))  # Userbot requests per second, all chats together
+USERBOT_BURST = int(os.getenv('USERBOT_BURST', '10'))
+USERBOT_PEER_RATE = float(os.getenv('USERBOT_PEER_RATE', '0.5'))  # Requests per second to any one chat
+USERBOT_PEER_BURST = int(os.getenv('USERBOT_PEER_BURST', '5'))
+USERBOT_MAX_FLOOD_WAIT = int(os.getenv('USERBOT_MAX_FLOOD_WAIT', '900'))  # Longer flood waits fail the request
+# Extra accounts (comma-separated session strings) that only download from twittervid_bot;
+# they forward videos to USERBOT_STAGING_CHAT, a channel or supergroup every account is a member of.
+# Only those share message IDs between accounts, so basic groups and private chats are rejected.
+USERBOT_POOL_SESSIONS = [s.strip() for s in os.getenv('USERBOT_POOL_SESSIONS', '').split(',') if s.strip()]
+_staging_chat = os.getenv('USERBOT_STAGING_CHAT', '').strip()
+USERBOT_STAGING_CHAT = int(_staging_chat) if _staging_chat.lstrip('-').isdigit() else _staging_chat or None
 YOUR_CHANNEL_ID = int(os.getenv('YOUR_CHANNEL_ID', ''))
 YOUR_SECOND_CHANNEL_ID = int(os.getenv('YOUR_SECOND_CHANNEL_ID', ''))
+# Channels each received video is posted to, as a JSON list of
+# {"chat_id", "name", "caption": [clean|ai|pad steps], "watermark", "schedule", "policy", "twitter"};
+# "twitter" marks the chat whose posts the Twitter outbox cross-posts
+CHANNEL_TARGETS = json.loads(os.getenv('CHANNEL_TARGETS') or 'null') or [
+    {'chat_id': YOUR_CHANNEL_ID, 'name': 'First channel', 'caption': ['clean', 'pad']},
+    {'chat_id': YOUR_SECOND_CHANNEL_ID, 'name': 'Second channel', 'caption': ['clean', 'ai', 'pad'], 'twitter': True},
+]
 TIMEZONE = pytz.timezone(os.getenv('TIMEZONE', 'Asia/Kolkata'))
+SCHEDULE_FILE = os.getenv('SCHEDULE_FILE', os.path.join(DATA_DIR, 'schedule.json'))
+# Extra schedule policies as JSON: {"name": {"title", "cron" | "every" + "start", "quiet_hours"}}
+SCHEDULE_POLICIES = json.loads(os.getenv('SCHEDULE_POLICIES') or '{}')
+SCHEDULE_QUIET_HOURS = os.getenv('SCHEDULE_QUIET_HOURS', '')  # e.g. 23:00-06:00, applies to every policy
+LINK_AI_CONCURRENCY = int(os.getenv('LINK_AI_CONCURRENCY', '2'))  # Concurrent AI caption requests
+LINK_SEND_CONCURRENCY = int(os.getenv('LINK_SEND_CONCURRENCY', '4'))  # Concurrent channel sends
+LINK_DOWNLOAD_TIMEOUT = int(os.getenv('LINK_DOWNLOAD_TIMEOUT', '600'))  # Seconds to wait for twittervid_bot
+IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', '5'))  # Links of one /import in the pipeline at once
+IMPORT_MAX_LINKS = int(os.getenv('IMPORT_MAX_LINKS', '1000'))
+STATUS_EDIT_INTERVAL = float(os.getenv('STATUS_EDIT_INTERVAL', '1.5'))  # Seconds between admin status edits, across all jobs
 ADMIN_IDS = [int(x.strip()) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()]
 PERPLEXITY_API_KEY = os.getenv('PERPLEXITY_API_KEY', '')
 
@@ -22,9 +67,17 @@ TWITTER_CONSUMER_KEY = os.getenv('TWITTER_CONSUMER_KEY', '')
 TWITTER_CONSUMER_SECRET = os.getenv('TWITTER_CONSUMER_SECRET', '')
 TWITTER_ACCESS_TOKEN = os.getenv('TWITTER_ACCESS_TOKEN', '')
 TWITTER_ACCESS_SECRET = os.getenv('TWITTER_ACCESS_SECRET', '')
+TWITTER_IO_WORKERS = int(os.getenv('TWITTER_IO_WORKERS', '4'))  # Threads for blocking tweepy calls
+TWITTER_UPLOAD_PARALLELISM = int(os.getenv('TWITTER_UPLOAD_PARALLELISM', '3'))  # Concurrent APPEND requests
+TWITTER_UPLOAD_RETRIES = int(os.getenv('TWITTER_UPLOAD_RETRIES', '5'))
+TWITTER_OUTBOX_FILE = os.getenv('TWITTER_OUTBOX_FILE', os.path.join(DATA_DIR, 'twitter_outbox.json'))
+TWITTER_OUTBOX_MAX_ATTEMPTS = int(os.getenv('TWITTER_OUTBOX_MAX_ATTEMPTS', '8'))
 
 # Watermark Configuration
 WATERMARK_LOGO_PATH = "hiddenhindu.png"  # Path to your logo file
 WATERMARK_POSITION = "top-left"  # top-left, top-right, bottom-left, bottom-right, center
 WATERMARK_OPACITY = 180  # 0-255 (0=transparent, 255=opaque)
 WATERMARK_ENABLED = True  # Set to False to disable watermark
+WATERMARK_WORKERS = int(os.getenv('WATERMARK_WORKERS', '2'))  # Threads compositing photo watermarks
+WATERMARK_CACHE_DIR = os.getenv('WATERMARK_CACHE_DIR', os.path.join(DATA_DIR, 'watermarked'))
+WATERMARK_CACHE_MB = int(os.getenv('WATERMARK_CACHE_MB', '2048'))
@@ -472,8 +472,6 @@ class QuizGenerator:
                 logger.error("Userbot not connected")
                 return
 
-            channel = await self.bot.userbot.get_entity(int(YOUR_CHANNEL_ID))
-
             poll_message = (
                 f"🎯 **{question_data['topic'].title()} Question**\n\n"
                 f"❓ {question_data['question']}\n\n"
@@ -484,7 +482,7 @@ class QuizGenerator:
                 f"💡 सही उत्तर: {question_data['correct']}"
             )
 
-            await self.bot.userbot.send_message(channel, poll_message)
+            await self.bot.dispatcher.send_message(YOUR_CHANNEL_ID, poll_message)
 
             logger.info(f"Posted question to channel: {question_data['topic']}")
             question_data['posted'] = True
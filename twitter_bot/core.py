@@ -4,20 +4,40 @@ Core functionality - Bot initialization and main logic
 
 import logging
 import asyncio
+import hmac
+import secrets
+import signal
+import time
 from datetime import datetime, timedelta
-from telethon import TelegramClient
-from telethon.sessions import StringSession
+from telegram import Update
 from telegram.ext import Application
 
 from config import (
-    TELEGRAM_BOT_TOKEN, API_ID, API_HASH, TELEGRAM_SESSION_STRING,
+    TELEGRAM_BOT_TOKEN, API_ID, API_HASH, TELEGRAM_SESSION_BACKEND,
     TWITTER_VID_BOT, YOUR_CHANNEL_ID, YOUR_SECOND_CHANNEL_ID, TIMEZONE,
-    ADMIN_IDS
+    ADMIN_IDS, MEDIA_TEMP_DIR, MEDIA_TEMP_QUOTA_MB, MEDIA_CACHE_DIR,
+    MEDIA_CACHE_MB, TWITTER_OUTBOX_FILE, CHANNEL_TARGETS, LINK_AI_CONCURRENCY,
+    LINK_SEND_CONCURRENCY, STATUS_EDIT_INTERVAL, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH,
+    TELEGRAM_WEBHOOK_SECRET
 )
 from ai_caption_enhancer import AICaptionEnhancer
 from .handlers import MessageHandlers
 from .twitter import TwitterPoster
 from .scheduler import ScheduleManager
+from .peers import PeerCache
+from .session import build_session
+from .startup import StartupGraph
+from .media import TempMediaDir, MediaCache
+from .outbox import TwitterOutbox
+from .transcoder import Transcoder
+from .watermark import ImageWatermarker, VideoWatermarker
+from .video_meta import VideoMetadata
+from .fanout import FanoutEngine, load_targets
+from .jobs import LinkPipeline
+from .importer import LinkImporter
+from .status import StatusBoard
+from .dispatcher import DispatchedClient, UserbotDispatcher
+from .pool import UserbotPool
 from .utils import TextUtils
 
 logger = logging.getLogger(__name__)
@@ -28,22 +48,17 @@ class TwitterBot:
         self.userbot = None
         self.bot_app = None
         self.loop = None
-        self.waiting_for_video = False
-        self.current_update = None
-        self.quality_selected = False
-        self.video_received = False
         
         # Scheduling related
-        self.scheduled_mode = False
+        self.schedule_policy = None  # Name of the active schedule policy, None posts immediately
         self.scheduled_counter = 0
         self.scheduled_messages = []
-        self.last_processed_message_id = None
-        self.incremental_schedule_mode = False
-        self.fixed_interval_mode = False
         
         # Server and shutdown
         self.quality_selection_timeout = 60
         self._shutdown_flag = False
+        self._shutdown_event = None
+        self.webhook_secret = TELEGRAM_WEBHOOK_SECRET or secrets.token_urlsafe(32)
         self.http_app = None
         self.runner = None
         self.site = None
@@ -53,8 +68,22 @@ class TwitterBot:
         # Initialize components
         self.ai_enhancer = AICaptionEnhancer()
         self.twitter_poster = TwitterPoster()
+        self.twitter_outbox = TwitterOutbox(self, TWITTER_OUTBOX_FILE)
+        self.transcoder = Transcoder()
+        self.image_watermarker = ImageWatermarker()
+        self.video_watermarker = VideoWatermarker(self.transcoder)
+        self.video_meta = VideoMetadata()
+        self.fanout = FanoutEngine(self, load_targets(CHANNEL_TARGETS))
+        self.link_pipeline = LinkPipeline(self, LINK_AI_CONCURRENCY, LINK_SEND_CONCURRENCY)
+        self.link_importer = LinkImporter(self)
+        self.status_board = StatusBoard(STATUS_EDIT_INTERVAL)
         self.handlers = MessageHandlers(self)
         self.scheduler = ScheduleManager(self)
+        self.peers = PeerCache(self)
+        self.dispatcher = UserbotDispatcher(self)
+        self.userbot_pool = UserbotPool(self)
+        self.temp_media = TempMediaDir(MEDIA_TEMP_DIR, MEDIA_TEMP_QUOTA_MB * 1024 * 1024)
+        self.media_cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MB * 1024 * 1024)
         self.text_utils = TextUtils()
         
         # Twitter posting feature
@@ -64,8 +93,9 @@ class TwitterBot:
         """Initialize Telegram userbot with string session"""
         try:
             logger.info("Starting UserBot initialization...")
-            session = StringSession(TELEGRAM_SESSION_STRING)
-            self.userbot = TelegramClient(
+            started_at = time.monotonic()
+            session = build_session()
+            self.userbot = DispatchedClient(
                 session=session,
                 api_id=int(API_ID),
                 api_hash=API_HASH
@@ -76,12 +106,12 @@ class TwitterBot:
 
             me = await self.userbot.get_me()
             logger.info(f"UserBot started as: {me.username} (ID: {me.id})")
+            connected_at = time.monotonic()
 
             try:
-                channel = await self.userbot.get_entity(YOUR_CHANNEL_ID)
-                logger.info(f"Verified access to channel: {channel.title}")
-                second_channel = await self.userbot.get_entity(YOUR_SECOND_CHANNEL_ID)
-                logger.info(f"Verified access to second channel: {second_channel.title}")
+                self.peers.clear()
+                lookups = await self.peers.resolve_all()
+                resolved_at = time.monotonic()
             except Exception as e:
                 logger.error(f"Channel access failed: {str(e)}")
                 raise
@@ -89,6 +119,13 @@ class TwitterBot:
             # Setup handlers
             await self.handlers.setup_handlers()
 
+            # Compare these across TELEGRAM_SESSION_BACKEND values to measure cold starts
+            logger.info(
+                f"UserBot ready in {time.monotonic() - started_at:.2f}s "
+                f"({TELEGRAM_SESSION_BACKEND} session: connect {connected_at - started_at:.2f}s, "
+                f"peers {resolved_at - connected_at:.2f}s with {lookups} network lookup(s))"
+            )
+
         except Exception as e:
             logger.error(f"Failed to initialize userbot: {str(e)}")
             raise
@@ -100,6 +137,9 @@ class TwitterBot:
         self.http_app = web.Application()
         self.http_app.router.add_get('/', self.handlers.health_check)
         self.http_app.router.add_get('/health', self.handlers.health_check)
+        self.http_app.router.add_get('/metrics', self.handlers.metrics)
+        if TELEGRAM_WEBHOOK_URL:
+            self.http_app.router.add_post(TELEGRAM_WEBHOOK_PATH, self.handle_webhook)
 
         runner = web.AppRunner(self.http_app)
         await runner.setup()
@@ -109,47 +149,77 @@ class TwitterBot:
         site = web.TCPSite(runner, '0.0.0.0', port)
         await site.start()
 
+        self.runner, self.site = runner, site
         logger.info(f"HTTP server started on port {port}")
         return runner, site
 
+    async def initialize_bot_app(self):
+        """Build and initialize the Telegram Bot application"""
+        logger.info("Initializing Telegram Bot...")
+        builder = Application.builder().token(TELEGRAM_BOT_TOKEN)
+        if TELEGRAM_WEBHOOK_URL:
+            # Updates are pushed to our HTTP server, so no polling updater
+            builder = builder.updater(None)
+        self.bot_app = builder.build()
+
+        # Add all handlers
+        await self.handlers.add_all_handlers(self.bot_app)
+
+        await self.bot_app.initialize()
+
     async def start_polling(self):
-        """Start bot polling in a separate task"""
+        """Start receiving bot updates"""
         try:
             if self._polling_started:
                 logger.warning("Polling already started, skipping...")
                 return
 
-            logger.info("Starting Telegram Bot...")
-            self.bot_app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-
-            # Add all handlers
-            await self.handlers.add_all_handlers(self.bot_app)
-
-            logger.info("Bot started successfully! Waiting for messages...")
-
-            await self.bot_app.bot.delete_webhook(drop_pending_updates=True)
-            await asyncio.sleep(2)
-
-            await self.bot_app.initialize()
             await self.bot_app.start()
-            await self.bot_app.updater.start_polling()
+            if TELEGRAM_WEBHOOK_URL:
+                await self.bot_app.bot.set_webhook(
+                    url=f"{TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}",
+                    secret_token=self.webhook_secret,
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True
+                )
+                logger.info(f"Webhook set to {TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}")
+            else:
+                # Dropping pending updates also removes any webhook left behind
+                await self.bot_app.updater.start_polling(drop_pending_updates=True)
 
             self._polling_started = True
-
-            while not self._shutdown_flag:
-                await asyncio.sleep(1)
+            logger.info("Bot started successfully! Waiting for messages...")
 
         except Exception as e:
             logger.error(f"Error in polling: {e}")
             self._polling_started = False
             raise
 
-        finally:
-            if self.bot_app:
-                await self.bot_app.updater.stop()
-                await self.bot_app.stop()
-                await self.bot_app.shutdown()
-            self._polling_started = False
+    async def handle_webhook(self, request):
+        """Receive one bot update pushed by Telegram"""
+        from aiohttp import web
+
+        secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(secret.encode(), self.webhook_secret.encode()):
+            return web.Response(status=403)
+
+        if not self.bot_app or not self.bot_app.running:
+            # Telegram retries, so the update is not lost
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        await self.bot_app.update_queue.put(Update.de_json(data, self.bot_app.bot))
+        return web.Response()
+
+    def request_shutdown(self):
+        """Stop run_async; safe to call from a signal handler"""
+        self._shutdown_flag = True
+        if self._shutdown_event:
+            self._shutdown_event.set()
 
     async def shutdown(self):
         """Shutdown all services properly"""
@@ -157,11 +227,24 @@ class TwitterBot:
         self._shutdown_flag = True
 
         try:
-            if self.bot_app and self.bot_app.running:
+            await self.status_board.stop()
+
+            if self.bot_app:
                 logger.info("Stopping bot application...")
-                await self.bot_app.updater.stop()
-                await self.bot_app.stop()
+                if self.bot_app.updater and self.bot_app.updater.running:
+                    await self.bot_app.updater.stop()
+                if self.bot_app.running:
+                    await self.bot_app.stop()
                 await self.bot_app.shutdown()
+                self.bot_app = None
+            self._polling_started = False
+
+            await self.link_importer.stop()
+            await self.link_pipeline.stop()
+            await self.userbot_pool.stop()
+            await self.dispatcher.stop()
+            await self.twitter_outbox.stop()
+            await self.transcoder.stop()
 
             if self.userbot and self.userbot.is_connected():
                 logger.info("Disconnecting userbot...")
@@ -170,25 +253,58 @@ class TwitterBot:
             if self.runner:
                 logger.info("Stopping HTTP server...")
                 await self.runner.cleanup()
+                self.runner = None
 
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
 
         logger.info("All services safely shut down")
 
+    async def _prepare_media_dirs(self):
+        """Remove temp media orphaned by a previous run and index the media cache"""
+        # Nothing of ours is in flight yet, so every temp file present is an orphan
+        self.temp_media.sweep_orphans()
+        self.media_cache.load()
+
+    def _build_startup_graph(self):
+        """Describe start-up steps and what each one needs to be ready first"""
+        startup = StartupGraph()
+        startup.add('http_server', self.start_http_server)
+        startup.add('media_dirs', self._prepare_media_dirs)
+        startup.add('userbot', self.initialize_userbot)
+        startup.add('twitter_client', self.twitter_poster.initialize_twitter_client)
+        startup.add('bot_app', self.initialize_bot_app)
+        startup.add('transcoder', self.transcoder.start)
+        startup.add(
+            'twitter_outbox',
+            self.twitter_outbox.start,
+            depends_on=('userbot', 'twitter_client', 'media_dirs', 'transcoder')
+        )
+        startup.add('schedule', self.scheduler.reconcile, depends_on=('userbot',))
+        startup.add('userbot_pool', self.userbot_pool.start, depends_on=('userbot',))
+        startup.add('link_pipeline', self.link_pipeline.start, depends_on=('userbot_pool', 'schedule'))
+        # Links must not arrive before the userbot can forward them, nor
+        # before the schedule knows which slots are already taken
+        startup.add('polling', self.start_polling, depends_on=('bot_app', 'userbot', 'schedule'))
+        return startup
+
     async def run_async(self):
         """Async main function"""
         try:
-            logger.info("Starting HTTP server for health checks...")
-            self.runner, self.site = await self.start_http_server()
-
-            logger.info("Initializing UserBot...")
-            await self.initialize_userbot()
+            self._shutdown_event = asyncio.Event()
+            await self.status_board.start()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, self.request_shutdown)
+                except (NotImplementedError, RuntimeError):
+                    pass
 
-            logger.info("Initializing Twitter client...")
-            await self.twitter_poster.initialize_twitter_client()
+            started_at = time.monotonic()
+            await self._build_startup_graph().run()
+            logger.info(f"Bot ready in {time.monotonic() - started_at:.2f}s")
 
-            await self.start_polling()
+            await self._shutdown_event.wait()
 
         except Exception as e:
             logger.error(f"Error in run_async: {e}")
@@ -196,8 +312,6 @@ class TwitterBot:
 
     def run(self):
         """Main function to run the bot"""
-        import time
-        
         retry_count = 0
         max_retries = 3
 
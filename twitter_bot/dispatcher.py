@@ -0,0 +1,226 @@
+"""
+Userbot dispatcher - Rate-limited, flood-wait-aware gateway for userbot RPCs
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from itertools import count
+
+from telethon import TelegramClient, functions, helpers, types, utils
+from telethon.errors import FloodWaitError, RandomIdDuplicateError, SlowModeWaitError
+
+from config import (
+    USERBOT_RATE, USERBOT_BURST, USERBOT_PEER_RATE, USERBOT_PEER_BURST, USERBOT_MAX_FLOOD_WAIT
+)
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: channel posts before cleanup and bookkeeping reads
+PRIORITIES = {'post': 0, 'housekeeping': 1}
+
+# Attempts for requests whose connection dropped before Telegram answered
+TRANSIENT_RETRIES = 3
+
+# Set while a call runs under the dispatcher, which handles flood waits itself
+_dispatched = contextvars.ContextVar('dispatched', default=False)
+
+
+class DispatchedClient(TelegramClient):
+    """TelegramClient that raises flood waits for dispatcher calls instead of sleeping through them
+
+    Other calls (downloads, uploads, entity lookups) keep Telethon's auto-sleep.
+    """
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        if _dispatched.get():
+            flood_sleep_threshold = 0
+        return await super()._call(sender, request, ordered, flood_sleep_threshold)
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Seconds until a token is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class UserbotDispatcher:
+    """Admits userbot requests through a global and a per-peer token bucket
+
+    A flood wait pauses only the peer it was raised for; other peers keep
+    going. Sends are built once with a fixed random_id, so a retry after
+    a flood wait or a lost response can never post the same message twice.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.bucket = TokenBucket(USERBOT_RATE, USERBOT_BURST)
+        self._peer_buckets = {}
+        self._paused_until = {}
+        self._waiting = []
+        self._order = count()
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    async def call(self, key, func, *args, priority='post', **kwargs):
+        """peers.call(key, func, ...) once the rate limits admit it, sitting out flood waits"""
+        failures = 0
+        while True:
+            await self._admit(key, priority)
+            token = _dispatched.set(True)
+            try:
+                return await self.bot.peers.call(key, func, *args, **kwargs)
+            except (FloodWaitError, SlowModeWaitError) as e:
+                if e.seconds > USERBOT_MAX_FLOOD_WAIT:
+                    raise
+                logger.warning(f"Telegram asked to wait {e.seconds}s for {key}, pausing that peer")
+                self._pause(key, e.seconds + 1)
+            except (ConnectionError, asyncio.TimeoutError) as e:
+                # Safe for sends too: the retry carries the same random_id
+                failures += 1
+                if failures >= TRANSIENT_RETRIES:
+                    raise
+                logger.warning(f"Request to {key} failed ({e}), retrying")
+                self._pause(key, 2 ** failures)
+            finally:
+                _dispatched.reset(token)
+
+    async def send_message(self, key, text, schedule=None, priority='post'):
+        """Idempotent send_message: retries reuse one random_id"""
+        userbot = self.bot.userbot
+        message, entities = await userbot._parse_message_text(text, ())
+        random_id = helpers.generate_random_long()
+
+        async def send(peer):
+            request = functions.messages.SendMessageRequest(
+                peer=peer, message=message, entities=entities,
+                random_id=random_id, schedule_date=schedule
+            )
+            return await self._send(peer, request)
+
+        return await self.call(key, send, priority=priority)
+
+    async def send_file(self, key, file, caption=None, schedule=None, priority='post', **options):
+        """Idempotent send_file for a single file; options as for send_file (attributes, thumb, ...)"""
+        userbot = self.bot.userbot
+        # Uploads happen here, once, before any attempt to send
+        _, media, _ = await userbot._file_to_media(file, **options)
+        message, entities = await userbot._parse_message_text(caption or "", ())
+        random_id = helpers.generate_random_long()
+
+        async def send(peer):
+            request = functions.messages.SendMediaRequest(
+                peer=peer, media=media, message=message, entities=entities,
+                random_id=random_id, schedule_date=schedule
+            )
+            return await self._send(peer, request)
+
+        return await self.call(key, send, priority=priority)
+
+    async def _send(self, peer, request):
+        """Run a send request, leaving flood waits to call(); None if Telegram already has it"""
+        userbot = self.bot.userbot
+        try:
+            result = await userbot(request)
+        except RandomIdDuplicateError:
+            logger.warning("Message was already delivered by an earlier attempt, not sending again")
+            return None
+
+        if isinstance(result, types.UpdateShortSentMessage):
+            return types.Message(
+                id=result.id, peer_id=utils.get_peer(peer), message=request.message,
+                date=result.date, out=result.out, media=result.media, entities=result.entities
+            )
+        return userbot._get_response_message(request, result, peer)
+
+    def _pause(self, key, seconds):
+        until = time.monotonic() + seconds
+        self._paused_until[key] = max(self._paused_until.get(key, 0), until)
+        self._bind()
+        self._wake.set()
+
+    def _bind(self):
+        """Waiting state for the running loop; each run attempt has its own loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters and the admission task of an earlier loop are gone; pauses still apply
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._waiting = []
+            self._task = None
+        return loop
+
+    async def _admit(self, key, priority):
+        future = self._bind().create_future()
+        self._waiting.append((PRIORITIES[priority], next(self._order), key, future))
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="userbot-dispatcher")
+        await future
+
+    def _peer_wait(self, key, now):
+        bucket = self._peer_buckets.setdefault(key, TokenBucket(USERBOT_PEER_RATE, USERBOT_PEER_BURST))
+        return max(self._paused_until.get(key, 0) - now, bucket.wait_time(now))
+
+    async def _run(self):
+        while True:
+            # Callers that were cancelled while waiting drop out here
+            self._waiting = [entry for entry in self._waiting if not entry[3].done()]
+            if not self._waiting:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            now = time.monotonic()
+            delay = self.bucket.wait_time(now)
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+
+            # Highest priority request whose peer is neither paused nor over its rate
+            chosen = None
+            delay = float('inf')
+            for entry in sorted(self._waiting):
+                peer_delay = self._peer_wait(entry[2], now)
+                if peer_delay <= 0:
+                    chosen = entry
+                    break
+                delay = min(delay, peer_delay)
+
+            if chosen is None:
+                await self._sleep(delay)
+                continue
+
+            self._waiting.remove(chosen)
+            self.bucket.take()
+            self._peer_buckets[chosen[2]].take()
+            chosen[3].set_result(None)
+
+    async def _sleep(self, delay):
+        """Sleep up to delay, waking early when a request arrives or a peer is paused"""
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
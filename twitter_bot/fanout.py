@@ -0,0 +1,194 @@
+"""
+Fan-out - Publish one source message to every configured channel target
+"""
+
+import asyncio
+import logging
+
+from .media import media_key
+from .utils import TextUtils
+
+logger = logging.getLogger(__name__)
+
+# Caption transforms, applied left to right
+CAPTION_STEPS = ('clean', 'ai', 'pad')
+
+
+class ChannelTarget:
+    """A destination channel and how its copy of a post is built"""
+
+    def __init__(self, chat_id, name=None, caption=('clean', 'pad'), watermark=True, schedule=True, policy=None,
+                 twitter=False):
+        unknown = [step for step in caption if step not in CAPTION_STEPS]
+        if unknown:
+            raise ValueError(f"Unknown caption step(s) for target {chat_id}: {', '.join(unknown)}")
+
+        self.chat_id = chat_id
+        self.name = name or str(chat_id)
+        self.caption = tuple(caption)
+        self.watermark = watermark
+        self.schedule = schedule
+        self.policy = policy
+        # Posts here are cross-posted by the Twitter outbox, which reads their media back
+        self.twitter = twitter
+
+    @classmethod
+    def from_config(cls, spec):
+        """Build a target from one CHANNEL_TARGETS entry"""
+        return cls(
+            int(spec['chat_id']),
+            name=spec.get('name'),
+            caption=spec.get('caption', ('clean', 'pad')),
+            watermark=spec.get('watermark', True),
+            schedule=spec.get('schedule', True),
+            policy=spec.get('policy'),
+            twitter=spec.get('twitter', False)
+        )
+
+
+def load_targets(specs):
+    """Parse CHANNEL_TARGETS, rejecting duplicate chats"""
+    targets = [ChannelTarget.from_config(spec) for spec in specs]
+    chat_ids = [target.chat_id for target in targets]
+    if len(set(chat_ids)) != len(chat_ids):
+        raise ValueError("CHANNEL_TARGETS lists the same chat more than once")
+    return targets
+
+
+class FanoutEngine:
+    """Send a message to all targets, building each distinct caption and media variant once"""
+
+    def __init__(self, bot, targets):
+        self.bot = bot
+        self.targets = targets
+        self.text_utils = TextUtils()
+
+    async def publish(self, message, scheduled_times=None, lane='now'):
+        """Send message to every target concurrently, scheduled at scheduled_times[chat_id] if given
+
+        Returns one result per target, in order: the sent message or the exception raised.
+        Each target starts sending as soon as its own caption and media are ready; AI and
+        send stages are entered in lane priority order.
+        """
+        stages = self.bot.link_pipeline.stages
+        captions = {}
+        media = {}
+
+        def caption_for(chain):
+            # Keyed by chain prefix, so ('clean', 'ai') reuses ('clean',) and
+            # targets with the same profile share one AI call
+            if chain not in captions:
+                captions[chain] = asyncio.ensure_future(self._build_caption(message, chain, caption_for, lane))
+            return captions[chain]
+
+        def media_for(watermark):
+            if watermark not in media:
+                media[watermark] = asyncio.ensure_future(self._prepare_media(message, watermark))
+            return media[watermark]
+
+        async def send(target):
+            caption = await caption_for(target.caption)
+            schedule = (scheduled_times or {}).get(target.chat_id)
+
+            if not message.media:
+                async with stages['send'].acquire(lane):
+                    return await self.bot.dispatcher.send_message(
+                        target.chat_id,
+                        caption or "📹 Video Content",
+                        schedule=schedule
+                    )
+
+            file, send_options, local_path = await media_for(target.watermark)
+            async with stages['send'].acquire(lane):
+                sent = await self.bot.dispatcher.send_file(
+                    target.chat_id,
+                    file,
+                    caption=caption,
+                    schedule=schedule,
+                    **send_options
+                )
+            if sent and local_path and target.twitter:
+                # The Twitter outbox reads this copy; it is a new document, so seed the
+                # cache with the file we just uploaded instead of fetching it back later
+                try:
+                    await self.bot.media_cache.adopt(media_key(sent), local_path)
+                except Exception as e:
+                    logger.warning(f"Could not cache uploaded media: {str(e)}")
+            return sent
+
+        if message.media:
+            # Start watermarking now so the re-encode overlaps the caption and AI steps
+            for target in self.targets:
+                media_for(target.watermark)
+
+        results = await asyncio.gather(*(send(target) for target in self.targets), return_exceptions=True)
+
+        # Collect intermediates a failed send never awaited
+        await asyncio.gather(*captions.values(), *media.values(), return_exceptions=True)
+
+        for target, result in zip(self.targets, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error sending to {target.name} ({target.chat_id}): {str(result)}")
+        return results
+
+    async def _build_caption(self, message, chain, caption_for, lane):
+        if not chain:
+            return message.text or ""
+
+        text = await caption_for(chain[:-1])
+        step = chain[-1]
+        if step == 'clean':
+            return self.text_utils.clean_text(text) if text else ""
+        if step == 'ai':
+            async with self.bot.link_pipeline.stages['ai'].acquire(lane):
+                return await self._enhance_caption(text)
+        return f"\n\n{text}\n\n" if text else ""
+
+    async def _enhance_caption(self, text):
+        """AI-enhanced caption, or the input unchanged if enhancement fails"""
+        try:
+            if not text or len(text.strip()) < 10:
+                return text
+
+            logger.info("Enhancing caption using AI...")
+            enhanced_caption = await self.bot.ai_enhancer.enhance_caption(text)
+
+            if enhanced_caption and enhanced_caption != text:
+                logger.info("Caption successfully enhanced with AI")
+                return enhanced_caption
+
+            logger.info("Using original caption (AI enhancement failed or not available)")
+            return text
+
+        except Exception as e:
+            logger.error(f"Error in AI caption enhancement: {str(e)}")
+            return text
+
+    async def _prepare_media(self, message, watermark):
+        """Media to send, its send_file options and the local file uploaded (if any)
+
+        Transformed media is uploaded once and the handle reused for every target;
+        re-uploaded videos carry explicit attributes and a thumbnail.
+        """
+        if not watermark:
+            return message.media, {}, None
+
+        if message.photo and self.bot.image_watermarker.enabled:
+            try:
+                data = await self.bot.userbot.download_media(message, file=bytes)
+                watermarked = await self.bot.image_watermarker.watermark_bytes(data)
+                return await self.bot.userbot.upload_file(watermarked, file_name="photo.jpg"), {}, None
+            except Exception as e:
+                logger.error(f"Error watermarking photo, sending original: {str(e)}")
+
+        if message.video and self.bot.video_watermarker.enabled:
+            try:
+                async with self.bot.media_cache.use(self.bot.userbot, message) as media_path:
+                    watermarked_path = await self.bot.video_watermarker.prepare(media_key(message), media_path)
+                uploaded = await self.bot.userbot.upload_file(watermarked_path, file_name="video.mp4")
+                send_options = await self.bot.video_meta.send_options(self.bot.userbot, watermarked_path)
+                return uploaded, send_options, watermarked_path
+            except Exception as e:
+                logger.error(f"Error watermarking video, sending original: {str(e)}")
+
+        return message.media, {}, None
@@ -7,12 +7,15 @@ import logging
 import asyncio
 from datetime import datetime
 from aiohttp import web
-from telethon import events
+from telethon import events, types, utils
+from telethon.errors import FloodWaitError
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 
-from config import TELEGRAM_BOT_TOKEN, TWITTER_VID_BOT, YOUR_CHANNEL_ID, YOUR_SECOND_CHANNEL_ID, ADMIN_IDS
+from config import TELEGRAM_BOT_TOKEN, TWITTER_VID_BOT, YOUR_SECOND_CHANNEL_ID, ADMIN_IDS, LINK_DOWNLOAD_TIMEOUT
 from .utils import TextUtils
+from .scheduler import SCHEDULE_BUTTONS
+from .jobs import LinkJob
 
 logger = logging.getLogger(__name__)
 
@@ -77,30 +80,28 @@ class MessageHandlers:
 
         return True
 
-    async def handle_twittervid_message(self, event):
-        """Handle responses from twittervid_bot"""
+    async def handle_twittervid_message(self, event, account):
+        """Handle responses from twittervid_bot to one pool account"""
         try:
-            if self.bot.last_processed_message_id is not None and event.message.id <= self.bot.last_processed_message_id:
+            if account.last_processed_message_id is not None and event.message.id <= account.last_processed_message_id:
                 return
 
-            self.bot.last_processed_message_id = event.message.id
+            account.last_processed_message_id = event.message.id
 
-            if self.bot.waiting_for_video and self.bot.current_update:
+            job = account.current_job
+            if account.waiting_for_video and job:
                 await asyncio.sleep(3)
 
                 message_text = event.message.text or ""
-                logger.info(f"Received message from twittervid_bot: {message_text[:100]}...")
+                logger.info(f"Received message from twittervid_bot on {account.name}: {message_text[:100]}...")
 
                 # Delete previous messages
                 try:
-                    async for old_msg in self.bot.userbot.iter_messages(TWITTER_VID_BOT, limit=5):
-                        if old_msg.id < event.message.id:
-                            await old_msg.delete()
-                            await asyncio.sleep(1)
+                    await self.bot.userbot_pool.clear_history(account, event.message.id)
                 except Exception as e:
                     logger.warning(f"Could not delete old messages: {str(e)}")
 
-                if "Select Video Quality" in message_text and not self.bot.quality_selected:
+                if "Select Video Quality" in message_text and not account.quality_selected:
                     logger.info("Quality selection detected")
                     try:
                         buttons = await event.message.get_buttons()
@@ -111,33 +112,37 @@ class MessageHandlers:
                                         await button.click()
                                         quality = button.text
                                         logger.info(f"Selected quality: {quality}")
-                                        if self.bot.current_update and self.bot.current_update.message:
-                                            await self.bot.current_update.message.reply_text(
-                                                f"✅ Video is being downloaded in {quality} quality..."
-                                            )
-                                        self.bot.quality_selected = True
+                                        job.report(f"✅ Video is being downloaded in {quality} quality...")
+                                        account.quality_selected = True
                                         return
 
                             if buttons[0]:
                                 await buttons[0][0].click()
                                 quality = buttons[0][0].text
                                 logger.info(f"Selected first available quality: {quality}")
-                                if self.bot.current_update and self.bot.current_update.message:
-                                    await self.bot.current_update.message.reply_text(
-                                        f"✅ Video is being downloaded in {quality} quality..."
-                                    )
-                                self.bot.quality_selected = True
+                                job.report(f"✅ Video is being downloaded in {quality} quality...")
+                                account.quality_selected = True
                                 return
 
                     except Exception as e:
                         logger.error(f"Error in quality selection: {str(e)}")
-                        self.bot.quality_selected = True
+                        account.quality_selected = True
 
                 has_media = bool(event.message.media)
                 is_final_message = any(word in message_text for word in ['Download', 'Ready', 'Here', 'Quality'])
 
-                if (has_media or is_final_message) and self.bot.quality_selected:
-                    await self._process_received_video(event)
+                if (has_media or is_final_message) and account.quality_selected:
+                    # Free the account for the next link while this one is enhanced and sent
+                    account.record(True)
+                    account.reset()
+                    try:
+                        message = await self.bot.userbot_pool.stage(account, event.message)
+                    except Exception as e:
+                        job.finish(False)
+                        job.report(f"❌ Could not hand the video to the posting account: {str(e)}")
+                        raise
+                    await self._process_received_video(message, job)
+                    await self.bot.userbot_pool.unstage(account, message)
 
         except Exception as e:
             logger.error(f"Error in handle_twittervid_message: {str(e)}")
@@ -153,115 +158,70 @@ class MessageHandlers:
 
             original_text = message.text or message.caption or ""
 
-            media_path = None
-            if message.media:
-                media_path = await self.bot.userbot.download_media(
-                    message,
-                    file=f"temp_twitter_media_{message.id}"
-                )
-
-            success = await self.bot.twitter_poster.post_to_twitter(original_text, media_path)
-
-            if success:
-                logger.info("Successfully posted to Twitter from second channel")
-            else:
-                logger.warning("Failed to post to Twitter from second channel")
-
-            if media_path:
-                import os
-                try:
-                    if os.path.exists(media_path):
-                        os.remove(media_path)
-                except Exception as e:
-                    logger.warning(f"Could not delete temp file: {str(e)}")
+            # Posting happens in the outbox worker so rate limits never lose a post
+            self.bot.twitter_outbox.enqueue(
+                YOUR_SECOND_CHANNEL_ID,
+                message.id,
+                original_text,
+                has_media=bool(message.media)
+            )
 
         except Exception as e:
             logger.error(f"Error handling second channel message for Twitter: {str(e)}")
 
-    async def _process_received_video(self, event):
-        """Process received video and send to both channels"""
+    async def _process_received_video(self, message, job):
+        """Process received video and send to every channel target"""
         try:
-            original_caption = self.text_utils.clean_text(event.message.text) if event.message.text else ""
-            
-            first_channel_caption = f"\n\n{original_caption}\n\n" if original_caption else ""
-            second_channel_caption = await self._get_enhanced_caption(original_caption)
-
-            async def send_to_channel(channel_id, caption_text):
-                scheduled_time = None
-                if self.bot.scheduled_mode or self.bot.incremental_schedule_mode or self.bot.fixed_interval_mode:
-                    scheduled_time = self.bot.scheduler._calculate_schedule_time()
-
-                if event.message.media:
-                    return await self.bot.userbot.send_file(
-                        channel_id,
-                        file=event.message.media,
-                        caption=caption_text,
-                        schedule=scheduled_time
-                    )
-                else:
-                    return await self.bot.userbot.send_message(
-                        channel_id,
-                        caption_text or "📹 Video Content",
-                        schedule=scheduled_time
-                    )
-
-            message1 = await send_to_channel(YOUR_CHANNEL_ID, first_channel_caption)
-            message2 = await send_to_channel(YOUR_SECOND_CHANNEL_ID, second_channel_caption)
-
-            scheduled_time = None
-            if self.bot.scheduled_mode or self.bot.incremental_schedule_mode or self.bot.fixed_interval_mode:
-                scheduled_time = self.bot.scheduler._calculate_schedule_time()
+            if message.media and self.bot.twitter_poster_enabled and self.bot.twitter_poster.twitter_client:
+                # The second-channel copy will be cross-posted to Twitter; fetch it
+                # once now, in parallel with the sends, instead of again later
+                self.bot.media_cache.prefetch(self.bot.userbot, message)
+
+            targets = self.bot.fanout.targets
+            # Slots are reserved before any send starts, one per policy group;
+            # 'now' lane jobs skip the schedule entirely
+            scheduled_times = {}
+            if job.lane == 'scheduled' and self.bot.scheduler.is_active():
+                scheduled_times = self.bot.scheduler.reserve_slots(targets)
+
+            results = await self.bot.fanout.publish(message, scheduled_times, lane=job.lane)
+            sent = [result for result in results if not isinstance(result, BaseException)]
+
+            self.bot.scheduler.release_slots({
+                target.chat_id: scheduled_times[target.chat_id]
+                for target, result in zip(targets, results)
+                if target.chat_id in scheduled_times and isinstance(result, BaseException)
+            })
+
+            if scheduled_times and sent:
                 self.bot.scheduled_counter += 1
-                self.bot.scheduled_messages.extend([message1.id, message2.id])
-
-                if self.bot.current_update and self.bot.current_update.message:
-                    await self.bot.current_update.message.reply_text(
-                        f"✅ Video successfully scheduled for {scheduled_time.strftime('%Y-%m-%d %H:%M')} IST in both channels!\n"
-                        f"📝 Second channel caption enhanced with AI."
-                    )
-            else:
-                if self.bot.current_update and self.bot.current_update.message:
-                    await self.bot.current_update.message.reply_text(
-                        "✅ Video successfully sent to both channels!\n"
-                        "📝 Second channel caption enhanced with AI."
-                    )
+                # None marks a send Telegram had already accepted on an earlier attempt
+                self.bot.scheduled_messages.extend(sent_message.id for sent_message in sent if sent_message)
 
-            logger.info(f"Message sent to both channels: {YOUR_CHANNEL_ID} and {YOUR_SECOND_CHANNEL_ID}")
-            self._reset_flags()
+            job.finish(bool(sent))
+            job.report(self._fanout_report(results, scheduled_times))
+            logger.info(f"Message sent to {len(sent)}/{len(results)} channel target(s)")
 
         except Exception as e:
+            job.finish(False)
             error_msg = f"❌ Error sending video to channels: {str(e)}"
             logger.error(error_msg)
-            if self.bot.current_update and self.bot.current_update.message:
-                await self.bot.current_update.message.reply_text(error_msg)
-            self._reset_flags()
-
-    async def _get_enhanced_caption(self, original_caption):
-        """Get AI-enhanced caption for second channel"""
-        try:
-            if not original_caption or len(original_caption.strip()) < 10:
-                return f"\n\n{original_caption}\n\n" if original_caption else ""
-
-            logger.info("Enhancing caption for second channel using AI...")
-            enhanced_caption = await self.bot.ai_enhancer.enhance_caption(original_caption)
-
-            if enhanced_caption and enhanced_caption != original_caption:
-                logger.info("Caption successfully enhanced with AI")
-                return f"\n\n{enhanced_caption}\n\n"
-            else:
-                logger.info("Using original caption (AI enhancement failed or not available)")
-                return f"\n\n{original_caption}\n\n"
-
-        except Exception as e:
-            logger.error(f"Error in AI caption enhancement: {str(e)}")
-            return f"\n\n{original_caption}\n\n"
-
-    def _reset_flags(self):
-        """Reset processing flags"""
-        self.bot.video_received = True
-        self.bot.waiting_for_video = False
-        self.bot.current_update = None
-        self.bot.quality_selected = False
+            job.report(error_msg)
+
+    def _fanout_report(self, results, scheduled_times):
+        """Per-target confirmation text for the admin"""
+        lines = []
+        for target, result in zip(self.bot.fanout.targets, results):
+            if isinstance(result, BaseException):
+                lines.append(f"❌ {target.name}: {str(result)}")
+                continue
+
+            action = "sent"
+            if target.chat_id in scheduled_times:
+                action = f"scheduled for {scheduled_times[target.chat_id].strftime('%Y-%m-%d %H:%M')} IST"
+            ai_note = " (AI caption)" if 'ai' in target.caption else ""
+            lines.append(f"✅ {target.name}: {action}{ai_note}")
+        return "\n".join(lines)
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command handler with buttons"""
@@ -306,12 +266,9 @@ class MessageHandlers:
             return
 
         try:
-            if query.data == "task_1hour":
-                await self.bot.scheduler.start_task_callback(query, context)
-            elif query.data == "task2_nowsend":
-                await self.bot.scheduler.start_task2_callback(query, context)
-            elif query.data == "task3_2hour":
-                await self.bot.scheduler.start_task3_callback(query, context)
+            policy_name = SCHEDULE_BUTTONS.get(query.data)
+            if policy_name:
+                await self.bot.scheduler.activate(query, policy_name, is_callback=True)
         except Exception as e:
             logger.error(f"Error in button handler: {e}")
             await query.edit_message_text("❌ Error processing your request. Please try again.")
@@ -375,40 +332,80 @@ class MessageHandlers:
                 return
 
             text = self.text_utils.clean_text(text)
+            lane = 'scheduled' if self.bot.scheduler.is_active() else 'now'
+            await self._queue_link(update, text, lane)
+
+        except Exception as e:
+            error_msg = f"❌ Error processing link: {str(e)}"
+            logger.error(error_msg)
+            if update and update.message:
+                await update.message.reply_text(error_msg)
+
+    async def now_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Post a link immediately, ahead of the scheduled backlog"""
+        if not await self.admin_only(update, context):
+            return
+
+        text = " ".join(context.args or [])
+        if not any(domain in text for domain in ['twitter.com', 'x.com']):
+            await update.message.reply_text("Usage: /now <Twitter/X link>")
+            return
 
-            self.bot.current_update = update
-            self.bot.waiting_for_video = True
-            self.bot.quality_selected = False
-            self.bot.video_received = False
+        await self._queue_link(update, self.text_utils.clean_text(text), 'now')
 
-            await message.reply_text("⏳ Processing link and downloading video...")
-            await self.bot.userbot.send_message(TWITTER_VID_BOT, text)
+    async def _queue_link(self, update, text, lane):
+        """Hand a link to the pipeline with its own live status message"""
+        status = self.bot.status_board.open(update.message)
+        busy = not self.bot.userbot_pool.has_idle() or len(self.bot.link_pipeline.queue) > 0
+        position = self.bot.link_pipeline.submit(LinkJob(text, lane, status))
+        if busy:
+            status.update(f"🕒 Queued in the {lane} lane (position {position})")
 
-            logger.info(f"Link sent to twittervid_bot: {text}")
+    async def download_link(self, job, account):
+        """Downloader stage: send the link to twittervid_bot from account and wait for its video"""
+        try:
+            account.start_job(job)
+
+            job.report("⏳ Processing link and downloading video...")
+            await self.bot.userbot_pool.send_link(account, job.text)
+
+            logger.info(f"Link sent to twittervid_bot from {account.name}: {job.text}")
 
+            # video_received is set once the video arrives and the account is free again
             start_time = datetime.now()
-            while (datetime.now() - start_time).seconds < self.bot.quality_selection_timeout:
-                if self.bot.quality_selected or self.bot.video_received:
+            while not account.video_received:
+                elapsed = (datetime.now() - start_time).seconds
+                if elapsed >= LINK_DOWNLOAD_TIMEOUT or (
+                    not account.quality_selected and elapsed >= self.bot.quality_selection_timeout
+                ):
+                    job.finish(False)
+                    job.report("⚠️ Timeout waiting for video processing. Please try again.")
+                    account.record(False)
+                    account.reset()
                     break
-                await asyncio.sleep(2)
+                await asyncio.sleep(1)
 
-            if not self.bot.quality_selected and not self.bot.video_received:
-                await message.reply_text("⚠️ Timeout waiting for video processing. Please try again.")
-                self._reset_flags()
+        except FloodWaitError:
+            # The account is resting now; another one takes the link
+            account.reset()
+            job.report("🕒 Download account is rate limited, retrying with another one...")
+            self.bot.link_pipeline.submit(job)
 
         except Exception as e:
+            job.finish(False)
             error_msg = f"❌ Error processing link: {str(e)}"
             logger.error(error_msg)
-            if update and update.message:
-                await update.message.reply_text(error_msg)
-            self._reset_flags()
+            job.report(error_msg)
+            account.record(False)
+            account.reset()
+
+    async def metrics(self, request):
+        """Prometheus metrics for the link pipeline and userbot pool"""
+        text = self.bot.link_pipeline.metrics() + self.bot.userbot_pool.metrics()
+        return web.Response(text=text, content_type="text/plain")
 
     async def setup_handlers(self):
         """Setup event handlers for userbot"""
-        @self.bot.userbot.on(events.NewMessage(from_users=TWITTER_VID_BOT))
-        async def on_twittervid_message(event):
-            await self.handle_twittervid_message(event)
-
         if self.bot.twitter_poster_enabled:
             @self.bot.userbot.on(events.NewMessage(chats=YOUR_SECOND_CHANNEL_ID))
             async def on_second_channel_message(event):
@@ -416,14 +413,35 @@ class MessageHandlers:
 
             logger.info("Second channel handler added for Twitter posting")
 
+        @self.bot.userbot.on(events.Raw(types.UpdateChannel))
+        async def on_channel_update(update):
+            self.bot.peers.invalidate_peer_id(utils.get_peer_id(types.PeerChannel(update.channel_id)))
+
+    def register_download_handler(self, account):
+        """Listen for twittervid_bot replies on one pool account"""
+        async def on_twittervid_message(event):
+            await self.handle_twittervid_message(event, account)
+
+        account.client.add_event_handler(on_twittervid_message, events.NewMessage(from_users=TWITTER_VID_BOT))
+
     async def add_all_handlers(self, bot_app):
         """Add all command and message handlers to bot - UPDATED WITH QUIZ"""
         # Original handlers
         bot_app.add_handler(CommandHandler("start", self.start_command))
-        bot_app.add_handler(CommandHandler("task", self.bot.scheduler.start_task))
-        bot_app.add_handler(CommandHandler("task2", self.bot.scheduler.start_task2))
-        bot_app.add_handler(CommandHandler("task3", self.bot.scheduler.start_task3))
+        bot_app.add_handler(CommandHandler("task", self.bot.scheduler.command_for('hourly')))
+        bot_app.add_handler(CommandHandler("task2", self.bot.scheduler.command_for('incremental')))
+        bot_app.add_handler(CommandHandler("task3", self.bot.scheduler.command_for('two_hourly')))
         bot_app.add_handler(CommandHandler("endtask", self.bot.scheduler.end_task))
+        bot_app.add_handler(CommandHandler("schedule", self.bot.scheduler.schedule_command))
+        bot_app.add_handler(CommandHandler("preview", self.bot.scheduler.preview_command))
+        bot_app.add_handler(CommandHandler("shift", self.bot.scheduler.shift_command))
+        bot_app.add_handler(CommandHandler("respace", self.bot.scheduler.respace_command))
+        bot_app.add_handler(CommandHandler("now", self.now_command))
+        bot_app.add_handler(CommandHandler("import", self.bot.link_importer.import_command))
+        bot_app.add_handler(MessageHandler(
+            filters.Document.FileExtension("txt") & filters.CaptionRegex(r'^/import\b'),
+            self.bot.link_importer.import_command
+        ))
         bot_app.add_handler(CommandHandler("twitter_poster", self.bot.twitter_poster.twitter_poster_command))
         
         # ✨ QUIZ HANDLERS - NEW
@@ -0,0 +1,153 @@
+"""
+Link import - Queue hundreds of Twitter/X links from one message or .txt file
+"""
+
+import asyncio
+import logging
+import time
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import IMPORT_CONCURRENCY, IMPORT_MAX_LINKS
+from .jobs import LinkJob
+from .utils import TextUtils
+
+logger = logging.getLogger(__name__)
+
+# Bot API refuses to download larger files anyway
+MAX_DOCUMENT_BYTES = 1024 * 1024
+
+
+class LinkImporter:
+    """/import: extract links, dedupe by tweet ID and feed them to the pipeline a few at a time"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.text_utils = TextUtils()
+        self._tasks = set()
+
+    async def import_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Import links from the command text, an attached .txt file, or the message replied to"""
+        if not await self.bot.handlers.admin_only(update, context):
+            return
+
+        try:
+            text = await self._read_source(update.message)
+        except ValueError as e:
+            await update.message.reply_text(f"⚠️ {str(e)}")
+            return
+        except Exception as e:
+            logger.error(f"Error reading import source: {str(e)}")
+            await update.message.reply_text(f"❌ Could not read the links: {str(e)}")
+            return
+
+        links, duplicates = self.extract_links(text)
+        if not links:
+            await update.message.reply_text(
+                "Usage: /import <links>, or send a .txt file with /import as caption, "
+                "or reply /import to a message with links"
+            )
+            return
+        if len(links) > IMPORT_MAX_LINKS:
+            await update.message.reply_text(f"⚠️ Too many links ({len(links)}), the limit is {IMPORT_MAX_LINKS}.")
+            return
+
+        status = self.bot.status_board.open(update.message, f"⏳ Importing {len(links)} link(s)...")
+        task = asyncio.create_task(self._run(status, links, duplicates))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _read_source(self, message):
+        """Text of the links: command arguments, a .txt document, or the replied-to message"""
+        sources = [message]
+        if message.reply_to_message:
+            sources.append(message.reply_to_message)
+
+        for source in sources:
+            if source.document:
+                if not (source.document.file_name or "").lower().endswith(".txt"):
+                    raise ValueError("Only .txt documents can be imported.")
+                if (source.document.file_size or 0) > MAX_DOCUMENT_BYTES:
+                    raise ValueError("That file is too large to import.")
+                file = await source.document.get_file()
+                data = await file.download_as_bytearray()
+                return bytes(data).decode('utf-8', errors='replace')
+
+        # The /import command itself carries no links
+        own_text = (message.text or "").partition(" ")[2]
+        reply_text = ""
+        if message.reply_to_message:
+            reply_text = message.reply_to_message.text or message.reply_to_message.caption or ""
+        return own_text or reply_text
+
+    def extract_links(self, text):
+        """Unique tweet links in order of appearance, and how many duplicates were dropped"""
+        links = {}
+        duplicates = 0
+        for url in self.text_utils.extract_urls(text or ""):
+            tweet_id = self.text_utils.tweet_id(url)
+            if not tweet_id:
+                continue
+            if tweet_id in links:
+                duplicates += 1
+                continue
+            links[tweet_id] = url.rstrip(').,;]>"\'')
+        return list(links.values()), duplicates
+
+    async def _run(self, status, links, duplicates):
+        """Feed links to the pipeline, at most IMPORT_CONCURRENCY of them pending at a time
+
+        Progress goes to one status message; updates are coalesced by the status board.
+        """
+        progress = {'queued': 0, 'posted': 0, 'failed': 0}
+        total = len(links)
+        slots = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        # Imports are backlog work: 'now' links always go first
+        lane = 'scheduled'
+
+        def status_text(final=False):
+            finished = progress['posted'] + progress['failed']
+            head = "✅ Import finished" if final else "⏳ Importing"
+            text = f"{head}: {finished}/{total} done, {progress['posted']} posted"
+            if progress['failed']:
+                text += f", {progress['failed']} failed"
+            if not final:
+                text += f", {progress['queued'] - finished} in the pipeline"
+            if duplicates:
+                text += f"\n{duplicates} duplicate link(s) skipped"
+            if not self.bot.scheduler.is_active():
+                text += "\nNo schedule mode is active, so links are posted immediately."
+            return text
+
+        async def track(job):
+            try:
+                ok = await job.done
+            finally:
+                slots.release()
+            progress['posted' if ok else 'failed'] += 1
+            status.update(status_text())
+
+        started = time.monotonic()
+        trackers = []
+        try:
+            for link in links:
+                await slots.acquire()
+                # Imported jobs have no status of their own; the batch message covers them
+                job = LinkJob(link, lane)
+                self.bot.link_pipeline.submit(job)
+                progress['queued'] += 1
+                status.update(status_text())
+                trackers.append(asyncio.create_task(track(job)))
+            await asyncio.gather(*trackers)
+        finally:
+            for tracker in trackers:
+                tracker.cancel()
+
+        logger.info(f"Imported {total} link(s) in {time.monotonic() - started:.0f}s")
+        status.update(status_text(final=True))
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
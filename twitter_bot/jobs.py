@@ -0,0 +1,265 @@
+"""
+Link jobs - Priority lanes for links moving through download, AI enhancement and sends
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order: breaking news first, then the scheduled backlog
+LANES = ('now', 'scheduled')
+
+# After this many 'now' grants in a row, a waiting 'scheduled' job goes next
+FAIR_SHARE = 3
+
+# Recent waits kept per lane for the metrics
+WAIT_SAMPLES = 200
+
+
+class LaneSelector:
+    """Strict priority with a fairness valve so the backlog still drains"""
+
+    def __init__(self):
+        self._streak = 0
+
+    def choose(self, waiting):
+        """Lane to serve next given which lanes have waiters, or None"""
+        urgent, backlog = (waiting.get(lane) for lane in LANES)
+        if urgent and (not backlog or self._streak < FAIR_SHARE):
+            self._streak += 1
+            return LANES[0]
+        if backlog:
+            self._streak = 0
+            return LANES[1]
+        return None
+
+
+class LaneStats:
+    """Waiting counts and wait-time samples per lane"""
+
+    def __init__(self):
+        self.waits = {lane: deque(maxlen=WAIT_SAMPLES) for lane in LANES}
+        self.served = {lane: 0 for lane in LANES}
+
+    def record(self, lane, waited):
+        self.waits[lane].append(waited)
+        self.served[lane] += 1
+
+    def summary(self, lane):
+        waits = self.waits[lane]
+        return {
+            'served': self.served[lane],
+            'wait_avg': sum(waits) / len(waits) if waits else 0.0,
+            'wait_max': max(waits) if waits else 0.0,
+        }
+
+
+class LinkJob:
+    """One link submitted by an admin"""
+
+    def __init__(self, text, lane, status=None):
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        self.text = text
+        self.status = status
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.done = asyncio.get_running_loop().create_future()
+
+    def report(self, text):
+        """Show text in the job's status message; jobs without one stay silent"""
+        if self.status:
+            self.status.update(text)
+
+    def finish(self, ok):
+        """Mark the job finished; done resolves to whether anything was posted"""
+        if not self.done.done():
+            self.done.set_result(ok)
+
+
+class LinkQueue:
+    """Two-lane queue feeding the downloader"""
+
+    def __init__(self):
+        self._lanes = {lane: deque() for lane in LANES}
+        self._selector = LaneSelector()
+        self._loop = None
+        self._ready = None
+        self.stats = LaneStats()
+
+    def _ready_event(self):
+        """The ready event of the running loop; each run attempt has its own loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._ready = asyncio.Event()
+        return self._ready
+
+    def put(self, job):
+        """Append a job to its lane; returns its position among jobs ahead of it"""
+        self._lanes[job.lane].append(job)
+        self._ready_event().set()
+        ahead = sum(len(self._lanes[lane]) for lane in LANES[:LANES.index(job.lane)])
+        return ahead + len(self._lanes[job.lane])
+
+    async def get(self):
+        """Next job by lane priority, waiting if the queue is empty"""
+        while True:
+            lane = self._selector.choose({lane: bool(jobs) for lane, jobs in self._lanes.items()})
+            if lane:
+                job = self._lanes[lane].popleft()
+                self.stats.record(lane, time.monotonic() - job.enqueued_at)
+                return job
+            ready = self._ready_event()
+            ready.clear()
+            await ready.wait()
+
+    def depth(self, lane):
+        return len(self._lanes[lane])
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self._lanes.values())
+
+
+class PrioritySemaphore:
+    """Semaphore whose waiters are woken by lane priority, with the same fairness valve"""
+
+    def __init__(self, value):
+        self._limit = value
+        self._value = value
+        self._waiters = {lane: deque() for lane in LANES}
+        self._selector = LaneSelector()
+        self._loop = None
+        self.stats = LaneStats()
+
+    def _bind(self):
+        """Start afresh on a new event loop; holders and waiters of the old one are gone"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._value = self._limit
+            self._waiters = {lane: deque() for lane in LANES}
+        return loop
+
+    def waiting(self, lane):
+        return len(self._waiters[lane])
+
+    @asynccontextmanager
+    async def acquire(self, lane):
+        """Hold one unit for the duration of the block"""
+        loop = self._bind()
+        started = time.monotonic()
+        if self._value > 0 and not any(self._waiters.values()):
+            self._value -= 1
+        else:
+            future = loop.create_future()
+            self._waiters[lane].append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future in self._waiters[lane]:
+                    self._waiters[lane].remove(future)
+                elif not future.cancelled() and self._loop is loop:
+                    # Granted just as we were cancelled; pass the unit on
+                    self._release()
+                raise
+        self.stats.record(lane, time.monotonic() - started)
+
+        try:
+            yield
+        finally:
+            # A holder left over from an earlier loop has nothing to give back
+            if self._loop is loop:
+                self._release()
+
+    def _release(self):
+        while True:
+            lane = self._selector.choose({lane: bool(waiters) for lane, waiters in self._waiters.items()})
+            if not lane:
+                self._value += 1
+                return
+            future = self._waiters[lane].popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+
+class LinkPipeline:
+    """Queue plus per-stage semaphores; each link is downloaded on a free pool account"""
+
+    def __init__(self, bot, ai_concurrency, send_concurrency):
+        self.bot = bot
+        self.queue = LinkQueue()
+        self.stages = {
+            'ai': PrioritySemaphore(ai_concurrency),
+            'send': PrioritySemaphore(send_concurrency),
+        }
+        self._worker = None
+        self._downloads = set()
+
+    def submit(self, job):
+        """Queue a job; returns its position"""
+        position = self.queue.put(job)
+        logger.info(f"Queued link in '{job.lane}' lane at position {position}")
+        return position
+
+    async def start(self):
+        if self._worker and not self._worker.done():
+            return
+        self._worker = asyncio.create_task(self._run(), name="link-downloader")
+
+    async def stop(self):
+        tasks = [self._worker, *self._downloads] if self._worker else list(self._downloads)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+
+    async def _run(self):
+        pool = self.bot.userbot_pool
+        while True:
+            # Take an account first, so lane priority is decided when a download can actually start
+            account = await pool.acquire()
+            try:
+                job = await self.queue.get()
+            except asyncio.CancelledError:
+                await pool.release(account)
+                raise
+            task = asyncio.create_task(self._download(job, account))
+            self._downloads.add(task)
+            task.add_done_callback(self._downloads.discard)
+
+    async def _download(self, job, account):
+        try:
+            await self.bot.handlers.download_link(job, account)
+        except Exception as e:
+            logger.error(f"Error processing queued link: {str(e)}")
+        finally:
+            await self.bot.userbot_pool.release(account)
+
+    def metrics(self):
+        """Prometheus text exposition of queue and stage state per lane"""
+        lines = [
+            "# TYPE link_queue_depth gauge",
+            "# TYPE link_queue_served_total counter",
+            "# TYPE link_queue_wait_seconds gauge",
+            "# TYPE link_stage_waiting gauge",
+            "# TYPE link_stage_wait_seconds gauge",
+        ]
+        for lane in LANES:
+            summary = self.queue.stats.summary(lane)
+            lines.append(f'link_queue_depth{{lane="{lane}"}} {self.queue.depth(lane)}')
+            lines.append(f'link_queue_served_total{{lane="{lane}"}} {summary["served"]}')
+            lines.append(f'link_queue_wait_seconds{{lane="{lane}",stat="avg"}} {summary["wait_avg"]:.3f}')
+            lines.append(f'link_queue_wait_seconds{{lane="{lane}",stat="max"}} {summary["wait_max"]:.3f}')
+            for stage, semaphore in self.stages.items():
+                stage_summary = semaphore.stats.summary(lane)
+                labels = f'stage="{stage}",lane="{lane}"'
+                lines.append(f'link_stage_waiting{{{labels}}} {semaphore.waiting(lane)}')
+                lines.append(f'link_stage_wait_seconds{{{labels},stat="avg"}} {stage_summary["wait_avg"]:.3f}')
+                lines.append(f'link_stage_wait_seconds{{{labels},stat="max"}} {stage_summary["wait_max"]:.3f}')
+        return "\n".join(lines) + "\n"
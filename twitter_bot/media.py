@@ -0,0 +1,279 @@
+"""
+Media plumbing - Telegram media streams, managed temp directory and media cache
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+
+from .media_upload import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Largest part size Telegram serves per GetFile request; CHUNK_SIZE is a multiple of it
+TELEGRAM_REQUEST_SIZE = 512 * 1024
+
+
+def media_key(message):
+    """Telegram document/photo ID, identical for every copy of the same file"""
+    media = message.document or message.photo
+    return media.id if media else None
+
+
+class TelegramMediaSource:
+    """Media of a Telegram message exposed as a re-openable chunk stream"""
+
+    def __init__(self, userbot, message):
+        self.userbot = userbot
+        self.message = message
+        self.file = message.file
+
+    @property
+    def key(self):
+        """Stable identity of the underlying file, shared across forwards"""
+        return ('telegram', media_key(self.message) or self.message.id)
+
+    @property
+    def size(self):
+        return self.file.size if self.file else None
+
+    @property
+    def mime_type(self):
+        return self.file.mime_type if self.file else None
+
+    @property
+    def ext(self):
+        return (self.file.ext if self.file else None) or ''
+
+    def open_stream(self, offset=0):
+        """Iterate over the media in CHUNK_SIZE pieces starting at offset"""
+        return self.userbot.iter_download(
+            self.message.media,
+            offset=offset,
+            chunk_size=CHUNK_SIZE,
+            request_size=TELEGRAM_REQUEST_SIZE,
+            file_size=self.size
+        )
+
+
+class TempQuotaError(Exception):
+    """Raised when a file can never fit in the temp directory quota"""
+
+
+class TempMediaDir:
+    """Dedicated temp directory with a byte quota and orphan sweeping"""
+
+    def __init__(self, path, quota_bytes):
+        self.path = path
+        self.quota_bytes = quota_bytes
+        self._reserved = 0
+        self._loop = None
+        self._condition = None
+
+    def _bind(self):
+        """Quota state for the running loop; reservations of an earlier loop died with it"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._reserved = 0
+            self._condition = asyncio.Condition()
+        return loop
+
+    def sweep_orphans(self, max_age=0):
+        """Delete files left behind by crashed runs; returns bytes freed"""
+        os.makedirs(self.path, exist_ok=True)
+        freed = 0
+        cutoff = time.time() - max_age
+
+        for name in os.listdir(self.path):
+            file_path = os.path.join(self.path, name)
+            try:
+                if os.path.isfile(file_path) and os.path.getmtime(file_path) <= cutoff:
+                    freed += os.path.getsize(file_path)
+                    os.remove(file_path)
+            except OSError as e:
+                logger.warning(f"Could not remove orphaned temp file {file_path}: {e}")
+
+        if freed:
+            logger.info(f"Swept {freed / (1024 * 1024):.2f}MB of orphaned temp media")
+        return freed
+
+    @asynccontextmanager
+    async def reserve(self, size, suffix=''):
+        """Yield a fresh path with size bytes of quota held; the file is removed on exit"""
+        if size > self.quota_bytes:
+            raise TempQuotaError(
+                f"File of {size / (1024 * 1024):.2f}MB exceeds temp quota of "
+                f"{self.quota_bytes / (1024 * 1024):.0f}MB"
+            )
+
+        loop = self._bind()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._reserved + size <= self.quota_bytes)
+            self._reserved += size
+
+        os.makedirs(self.path, exist_ok=True)
+        file_path = os.path.join(self.path, f"{uuid.uuid4().hex}{suffix}")
+        try:
+            yield file_path
+        finally:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except OSError as e:
+                logger.warning(f"Could not delete temp file: {str(e)}")
+
+            if self._loop is loop:
+                async with self._condition:
+                    self._reserved -= size
+                    self._condition.notify_all()
+
+
+class MediaCache:
+    """Size-bounded LRU cache of downloaded Telegram media keyed by document ID"""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pins = Counter()
+        self._inflight = {}
+
+    def load(self):
+        """Index files kept from previous runs, oldest first"""
+        os.makedirs(self.path, exist_ok=True)
+        files = []
+
+        for name in os.listdir(self.path):
+            file_path = os.path.join(self.path, name)
+            if name.endswith('.part'):
+                # Interrupted download
+                os.remove(file_path)
+                continue
+            stem, _ = os.path.splitext(name)
+            try:
+                key = int(stem)
+            except ValueError:
+                continue
+            if os.path.isfile(file_path):
+                files.append((os.path.getmtime(file_path), key, file_path))
+
+        for _, key, file_path in sorted(files):
+            size = os.path.getsize(file_path)
+            self._entries[key] = (file_path, size)
+            self._bytes += size
+
+        self._evict()
+        logger.info(f"Media cache holds {len(self._entries)} files ({self._bytes / (1024 * 1024):.2f}MB)")
+
+    async def adopt(self, key, source_path):
+        """Cache a local file as the media of document key, e.g. a video we uploaded ourselves"""
+        if key is None or key in self._entries or key in self._inflight:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        file_path = os.path.join(self.path, f"{key}{os.path.splitext(source_path)[1]}")
+
+        def place():
+            try:
+                os.link(source_path, file_path)
+            except OSError:
+                # Different filesystem, or links unsupported
+                shutil.copyfile(source_path, f"{file_path}.part")
+                os.replace(f"{file_path}.part", file_path)
+
+        await asyncio.get_running_loop().run_in_executor(None, place)
+        size = os.path.getsize(file_path)
+        self._entries[key] = (file_path, size)
+        self._bytes += size
+        logger.info(f"Cached uploaded media {key} ({size / (1024 * 1024):.2f}MB)")
+        self._evict()
+
+    def has(self, message):
+        """Whether the media is cached or already being downloaded"""
+        key = media_key(message)
+        return key is not None and (key in self._entries or key in self._inflight)
+
+    def prefetch(self, userbot, message):
+        """Start downloading the media in the background if it is not cached yet"""
+        key = media_key(message)
+        if key is None or self.has(message):
+            return
+        if message.file and message.file.size and message.file.size > self.max_bytes:
+            return
+        self._start_download(userbot, message, key)
+
+    @asynccontextmanager
+    async def use(self, userbot, message):
+        """Yield a local path to the media, downloading it at most once"""
+        key = media_key(message)
+        if key is None:
+            raise ValueError("Message has no cacheable media")
+
+        # Pinned entries are never evicted while a consumer reads them
+        self._pins[key] += 1
+        try:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                file_path = self._entries[key][0]
+            else:
+                task = self._inflight.get(key) or self._start_download(userbot, message, key)
+                file_path = await asyncio.shield(task)
+            yield file_path
+        finally:
+            self._pins[key] -= 1
+            if self._pins[key] <= 0:
+                del self._pins[key]
+            self._evict()
+
+    def _start_download(self, userbot, message, key):
+        task = asyncio.create_task(self._download(userbot, message, key))
+        self._inflight[key] = task
+        task.add_done_callback(self._log_download_failure)
+        return task
+
+    @staticmethod
+    def _log_download_failure(task):
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Media cache download failed: {task.exception()}")
+
+    async def _download(self, userbot, message, key):
+        os.makedirs(self.path, exist_ok=True)
+        ext = (message.file.ext if message.file else None) or ''
+        file_path = os.path.join(self.path, f"{key}{ext}")
+        part_path = f"{file_path}.part"
+
+        try:
+            await userbot.download_media(message, file=part_path)
+            os.replace(part_path, file_path)
+
+            size = os.path.getsize(file_path)
+            self._entries[key] = (file_path, size)
+            self._bytes += size
+            logger.info(f"Cached media {key} ({size / (1024 * 1024):.2f}MB)")
+            self._evict()
+            return file_path
+        finally:
+            self._inflight.pop(key, None)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def _evict(self):
+        """Drop least recently used, unpinned files until under the size bound"""
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if self._pins[key]:
+                continue
+
+            file_path, size = self._entries.pop(key)
+            self._bytes -= size
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logger.warning(f"Could not evict cached media {file_path}: {e}")
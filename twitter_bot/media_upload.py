@@ -0,0 +1,251 @@
+"""
+Chunked media upload - INIT/APPEND/FINALIZE with STATUS polling and resume
+"""
+
+import asyncio
+import logging
+import mimetypes
+import os
+import time
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+from telethon.errors import ServerError
+from tweepy.errors import HTTPException, TooManyRequests, TweepyException, TwitterServerError
+
+from config import TWITTER_UPLOAD_PARALLELISM, TWITTER_UPLOAD_RETRIES
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4 * 1024 * 1024  # APPEND accepts at most 5 MB per segment
+
+# Per-category size limits of the media/upload endpoint
+MEDIA_SIZE_LIMITS = {
+    'tweet_video': 512 * 1024 * 1024,
+    'tweet_gif': 15 * 1024 * 1024,
+    'tweet_image': 5 * 1024 * 1024,
+}
+
+# Uploaded but unused media IDs expire after 24 hours; leave some margin
+SESSION_TTL = 23 * 60 * 60
+
+TRANSIENT_ERRORS = (TwitterServerError, TooManyRequests, RequestsConnectionError, Timeout)
+
+# Failures of the source stream after which it is reopened at the current offset
+STREAM_ERRORS = (OSError, asyncio.TimeoutError, ServerError)
+
+
+def is_transient(error):
+    """Whether a Twitter call failure is worth retrying
+
+    tweepy's v1.1 API wraps connection errors and timeouts in a bare TweepyException.
+    """
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return (
+        isinstance(error, TweepyException) and not isinstance(error, HTTPException)
+        and isinstance(error.__context__, (RequestsConnectionError, Timeout))
+    )
+
+
+class MediaUploadError(Exception):
+    """Raised when Twitter rejects or fails to process an upload"""
+
+
+def media_category(media_type):
+    """Map a MIME type to the media_category the upload endpoint expects"""
+    if media_type == 'image/gif':
+        return 'tweet_gif'
+    if media_type and media_type.startswith('image/'):
+        return 'tweet_image'
+    return 'tweet_video'
+
+
+class UploadSession:
+    """State of one INIT'd upload, kept so a failed upload can resume"""
+
+    def __init__(self, media_id, total_bytes, media_type, category):
+        self.media_id = media_id
+        self.total_bytes = total_bytes
+        self.media_type = media_type
+        self.category = category
+        self.done_segments = set()
+        self.expires_at = time.monotonic() + SESSION_TTL
+
+    @property
+    def segment_count(self):
+        return max(1, -(-self.total_bytes // CHUNK_SIZE))
+
+    def missing_segments(self):
+        return [i for i in range(self.segment_count) if i not in self.done_segments]
+
+    def is_expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+class ChunkedUploader:
+    """Upload media in parallel chunks, resuming partially uploaded files"""
+
+    def __init__(self, poster):
+        self.poster = poster
+        self._sessions = {}
+
+    async def upload_file(self, media_path, media_type=None):
+        """Upload a local file and return its media ID once Twitter has processed it"""
+        media_type = media_type or mimetypes.guess_type(media_path)[0] or 'video/mp4'
+        stat = os.stat(media_path)
+        key = (os.path.abspath(media_path), stat.st_size, stat.st_mtime)
+
+        def read_segment(index):
+            with open(media_path, 'rb') as f:
+                f.seek(index * CHUNK_SIZE)
+                return f.read(CHUNK_SIZE)
+
+        async def read_chunk(index):
+            return await self.poster._run_io(read_segment, index)
+
+        async def append_missing(api, session):
+            await self._append_segments(api, session, read_chunk)
+
+        return await self._upload(key, stat.st_size, media_type, append_missing)
+
+    async def upload_stream(self, key, total_bytes, media_type, open_stream):
+        """Upload from an async byte stream without touching the disk
+
+        open_stream(offset) must return an async iterator of CHUNK_SIZE chunks
+        starting at offset, so a broken stream can be reopened where it stopped.
+        """
+        async def append_missing(api, session):
+            await self._append_stream(api, session, open_stream)
+
+        return await self._upload(key, total_bytes, media_type, append_missing)
+
+    async def _upload(self, key, total_bytes, media_type, append_missing):
+        """Run INIT (or resume), APPEND the missing segments and FINALIZE"""
+        category = media_category(media_type)
+        limit = MEDIA_SIZE_LIMITS[category]
+        if total_bytes > limit:
+            raise MediaUploadError(
+                f"Media too large for {category} ({total_bytes / (1024 * 1024):.2f}MB > "
+                f"{limit / (1024 * 1024):.0f}MB)"
+            )
+
+        api = self.poster.legacy_api
+
+        session = self._sessions.get(key)
+        if session and not session.is_expired():
+            logger.info(
+                f"Resuming upload of media {session.media_id}: "
+                f"{len(session.done_segments)}/{session.segment_count} segments already sent"
+            )
+        else:
+            media = await self._with_retries(
+                "INIT", api.chunked_upload_init, total_bytes, media_type, media_category=category
+            )
+            session = UploadSession(media.media_id, total_bytes, media_type, category)
+            self._sessions[key] = session
+
+        await append_missing(api, session)
+        await self._finalize(api, session)
+
+        self._sessions.pop(key, None)
+        return session.media_id
+
+    async def _append_segments(self, api, session, read_chunk):
+        """APPEND every missing segment with bounded parallelism"""
+        semaphore = asyncio.Semaphore(TWITTER_UPLOAD_PARALLELISM)
+
+        async def append(index):
+            async with semaphore:
+                data = await read_chunk(index)
+                await self._with_retries(
+                    f"APPEND #{index}", api.chunked_upload_append, session.media_id, data, index
+                )
+                session.done_segments.add(index)
+
+        await asyncio.gather(*(append(index) for index in session.missing_segments()))
+
+    async def _append_stream(self, api, session, open_stream):
+        """APPEND segments as they arrive from the stream, at most N buffered at once"""
+        missing = session.missing_segments()
+        if not missing:
+            return
+
+        semaphore = asyncio.Semaphore(TWITTER_UPLOAD_PARALLELISM)
+        tasks = []
+
+        async def append(index, data):
+            try:
+                await self._with_retries(
+                    f"APPEND #{index}", api.chunked_upload_append, session.media_id, data, index
+                )
+                session.done_segments.add(index)
+            finally:
+                semaphore.release()
+
+        index = missing[0]
+        stream_failures = 0
+        try:
+            while index < session.segment_count:
+                try:
+                    async for data in open_stream(index * CHUNK_SIZE):
+                        if index not in session.done_segments:
+                            # Wait for a free slot before holding another chunk in memory
+                            await semaphore.acquire()
+                            failed = next((t for t in tasks if t.done() and t.exception()), None)
+                            if failed:
+                                semaphore.release()
+                                raise failed.exception()
+                            tasks.append(asyncio.create_task(append(index, data)))
+                        index += 1
+                        if index >= session.segment_count:
+                            break
+                    else:
+                        if index < session.segment_count:
+                            raise MediaUploadError(
+                                f"Media stream ended at segment {index} of {session.segment_count}"
+                            )
+                except STREAM_ERRORS as e:
+                    stream_failures += 1
+                    if stream_failures > TWITTER_UPLOAD_RETRIES:
+                        raise
+                    logger.warning(f"Media stream failed at segment {index} ({e}), reopening")
+                    await asyncio.sleep(min(2 ** stream_failures, 60))
+
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _finalize(self, api, session):
+        """FINALIZE the upload and poll STATUS until processing completes"""
+        media = await self._with_retries("FINALIZE", api.chunked_upload_finalize, session.media_id)
+        processing_info = getattr(media, 'processing_info', None)
+
+        while processing_info:
+            state = processing_info.get('state')
+            if state == 'succeeded':
+                break
+            if state == 'failed':
+                error = processing_info.get('error', {})
+                # The media ID is dead; a retry has to start from INIT
+                session.expires_at = 0
+                raise MediaUploadError(f"Twitter could not process media: {error.get('message', error)}")
+
+            await asyncio.sleep(processing_info.get('check_after_secs', 5))
+            media = await self._with_retries("STATUS", api.get_media_upload_status, session.media_id)
+            processing_info = getattr(media, 'processing_info', None)
+
+        logger.info(f"Media {session.media_id} uploaded in {session.segment_count} segment(s)")
+
+    async def _with_retries(self, label, func, *args, **kwargs):
+        """Call a tweepy upload method, retrying transient failures with backoff"""
+        for attempt in range(1, TWITTER_UPLOAD_RETRIES + 1):
+            try:
+                return await self.poster._run_io(func, *args, **kwargs)
+            except Exception as e:
+                if not is_transient(e) or attempt == TWITTER_UPLOAD_RETRIES:
+                    raise
+                delay = min(2 ** attempt, 60)
+                logger.warning(f"Upload {label} failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
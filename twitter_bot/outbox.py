@@ -0,0 +1,225 @@
+"""
+Twitter outbox - Persistent, ordered queue of pending tweets
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+from tweepy.errors import Forbidden, HTTPException, TooManyRequests, TweepyException, Unauthorized
+
+from config import TWITTER_OUTBOX_MAX_ATTEMPTS
+from .media import TelegramMediaSource
+from .media_upload import MediaUploadError, MEDIA_SIZE_LIMITS, SESSION_TTL, is_transient
+from .transcoder import needs_transcode_hint
+from .twitter import TwitterUnavailable
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (RequestsConnectionError, Timeout, OSError, asyncio.TimeoutError)
+
+
+class SourceMessageGone(Exception):
+    """Raised when the Telegram message behind an entry no longer exists"""
+
+
+def is_duplicate_tweet(error):
+    """Twitter answers 403 when the same text was already posted, i.e. an earlier try went through"""
+    messages = getattr(error, 'api_messages', None) or [str(error)]
+    return isinstance(error, Forbidden) and any('duplicate' in m.lower() for m in messages)
+
+
+class TwitterOutbox:
+    """Queue tweets on disk and drain them in order at the rate Twitter allows"""
+
+    def __init__(self, bot, path):
+        self.bot = bot
+        self.path = path
+        self._entries = self._load()
+        self._wakeup = None
+        self._worker = None
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+            if entries:
+                logger.info(f"Loaded {len(entries)} pending tweet(s) from outbox")
+            return entries
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read Twitter outbox, starting empty: {e}")
+            return []
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def enqueue(self, chat_id, message_id, text, has_media=False):
+        """Persist a tweet for the Telegram message and wake the worker"""
+        self._entries.append({
+            'id': uuid.uuid4().hex,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': text,
+            'has_media': has_media,
+            'media_id': None,
+            'media_uploaded_at': None,
+            'attempts': 0,
+            'created_at': time.time(),
+        })
+        self._save()
+        logger.info(f"Queued tweet for message {message_id} ({len(self._entries)} pending)")
+
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start draining the outbox"""
+        if self._worker and not self._worker.done():
+            return
+        if not self.bot.twitter_poster.twitter_client:
+            logger.warning(f"Twitter client unavailable, {len(self._entries)} queued tweet(s) will wait")
+            return
+
+        self._wakeup = asyncio.Event()
+        if self._entries:
+            self._wakeup.set()
+        self._worker = asyncio.create_task(self._run(), name="twitter-outbox")
+
+    async def stop(self):
+        """Stop the worker; pending entries stay on disk"""
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    async def _run(self):
+        poster = self.bot.twitter_poster
+
+        while True:
+            if not self._entries:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            wait = poster.seconds_until_reset()
+            if wait:
+                logger.info(f"Twitter rate limit exhausted, outbox resumes in {wait:.0f}s")
+                await asyncio.sleep(wait)
+                poster.rate_limit_remaining = None
+
+            # Only the head entry is ever attempted, which keeps tweets in order
+            entry = self._entries[0]
+            try:
+                await self._post(entry)
+                self._finish(entry)
+
+            except TooManyRequests:
+                if not poster.seconds_until_reset():
+                    # No usable headers, fall back to a conservative pause
+                    await asyncio.sleep(60)
+
+            except (Unauthorized, TwitterUnavailable) as e:
+                # Entries stay on disk and are posted once the credentials are fixed
+                logger.error(f"Twitter outbox stopped with {len(self._entries)} queued tweet(s): {e}")
+                return
+
+            except (SourceMessageGone, MediaUploadError) as e:
+                logger.error(f"Dropping queued tweet for message {entry['message_id']}: {e}")
+                self._finish(entry)
+
+            except TweepyException as e:
+                if is_duplicate_tweet(e):
+                    logger.info(f"Tweet for message {entry['message_id']} was already posted")
+                    self._finish(entry)
+                elif isinstance(e, HTTPException) and not is_transient(e):
+                    logger.error(f"Twitter rejected tweet for message {entry['message_id']}: {e}")
+                    self._finish(entry)
+                else:
+                    # 5xx, or a network failure tweepy wrapped; the entry must survive it
+                    await self._retry_later(entry, e)
+
+            except TRANSIENT_ERRORS as e:
+                await self._retry_later(entry, e)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                logger.error(f"Unexpected error posting queued tweet: {e}")
+                await self._retry_later(entry, e)
+
+    def _finish(self, entry):
+        self._entries.remove(entry)
+        self._save()
+
+    async def _retry_later(self, entry, error):
+        entry['attempts'] += 1
+        if entry['attempts'] >= TWITTER_OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"Giving up on tweet for message {entry['message_id']} after {entry['attempts']} attempts: {error}")
+            self._finish(entry)
+            return
+
+        self._save()
+        delay = min(2 ** entry['attempts'], 900)
+        logger.warning(f"Tweet for message {entry['message_id']} failed ({error}), retrying in {delay}s")
+        await asyncio.sleep(delay)
+
+    async def _post(self, entry):
+        poster = self.bot.twitter_poster
+        media_ids = []
+
+        if entry['has_media']:
+            uploaded_at = entry['media_uploaded_at']
+            # Reuse an earlier upload so retries never send the bytes twice
+            if not entry['media_id'] or time.time() - uploaded_at > SESSION_TTL:
+                entry['media_id'] = await self._upload_media(entry)
+                entry['media_uploaded_at'] = time.time()
+                self._save()
+            media_ids = [entry['media_id']]
+
+        await poster.create_tweet(poster.prepare_text(entry['text']), media_ids)
+
+    async def _upload_media(self, entry):
+        """Upload the entry's Telegram media through the cheapest available path"""
+        poster = self.bot.twitter_poster
+        userbot = self.bot.userbot
+
+        message = await self.bot.dispatcher.call(
+            entry['chat_id'], userbot.get_messages, ids=entry['message_id'], priority='housekeeping'
+        )
+        if not message or not message.media:
+            raise SourceMessageGone(f"message {entry['message_id']} has no media any more")
+
+        if self.bot.media_cache.has(message) or needs_transcode_hint(message.file):
+            # Already fetched by the channel pipeline, or must be re-encoded anyway
+            async with self.bot.media_cache.use(userbot, message) as media_path:
+                if message.video or message.gif:
+                    media_path = await self.bot.transcoder.prepare(media_path)
+                return await poster.upload_media(media_path)
+
+        source = TelegramMediaSource(userbot, message)
+        if source.size:
+            # Known size: pipe Telegram chunks straight into the chunked upload
+            return await poster.upload_media(media_source=source)
+
+        # Size unknown: hold the most Twitter would accept, so concurrent downloads
+        # queue on the temp quota instead of filling the disk
+        bound = min(self.bot.temp_media.quota_bytes, max(MEDIA_SIZE_LIMITS.values()))
+        async with self.bot.temp_media.reserve(bound, suffix=source.ext) as temp_path:
+            media_path = await userbot.download_media(message, file=temp_path)
+            return await poster.upload_media(media_path)
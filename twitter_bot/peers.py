@@ -0,0 +1,109 @@
+"""
+Peer cache - Resolved InputPeer objects shared by all modules
+"""
+
+import asyncio
+import logging
+from telethon import utils
+from telethon.errors import ChannelInvalidError, PeerIdInvalidError
+
+from config import TWITTER_VID_BOT, YOUR_CHANNEL_ID, YOUR_SECOND_CHANNEL_ID
+
+logger = logging.getLogger(__name__)
+
+# Errors Telegram returns when a cached access hash is no longer valid
+STALE_PEER_ERRORS = (ChannelInvalidError, PeerIdInvalidError)
+
+
+class PeerCache:
+    """Resolve each channel/bot to an InputPeer once and reuse it everywhere"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._peers = {}
+        self._titles = {}
+        self._locks = {}
+
+    def targets(self):
+        """Peers every component talks to"""
+        keys = [YOUR_CHANNEL_ID, YOUR_SECOND_CHANNEL_ID]
+        keys += [target.chat_id for target in self.bot.fanout.targets if target.chat_id not in keys]
+        keys.append(TWITTER_VID_BOT)
+        # The pool's staging chat is optional and checked by UserbotPool.start
+        return keys
+
+    def clear(self):
+        """Forget all resolved peers (new userbot session)"""
+        self._peers.clear()
+        self._titles.clear()
+        # Locks are bound to the loop of the run that used them
+        self._locks.clear()
+
+    def invalidate(self, key):
+        """Drop a single cached peer so the next use resolves it again"""
+        self._peers.pop(key, None)
+
+    def invalidate_peer_id(self, peer_id):
+        """Drop whichever cached entry resolves to the given marked peer ID"""
+        for key, peer in list(self._peers.items()):
+            if utils.get_peer_id(peer) == peer_id:
+                logger.info(f"Peer {key} changed, will resolve again on next use")
+                self._peers.pop(key, None)
+
+    def title(self, key):
+        """Display name captured when the peer was resolved"""
+        return self._titles.get(key, str(key))
+
+    async def resolve_all(self):
+        """Resolve every target peer concurrently, raising if any is inaccessible
+
+        Returns how many peers needed a network lookup.
+        """
+        async def resolve(key):
+            if self._from_session(key) is not None:
+                logger.info(f"Loaded {key} from session cache")
+                return False
+            await self.refresh(key)
+            logger.info(f"Verified access to {self.title(key)}")
+            return True
+
+        return sum(await asyncio.gather(*(resolve(key) for key in self.targets())))
+
+    def _from_session(self, key):
+        """Look key up in the session's entity table without any RPC"""
+        try:
+            peer = self.bot.userbot.session.get_input_entity(key)
+        except (ValueError, TypeError):
+            return None
+        self._peers[key] = peer
+        return peer
+
+    async def get(self, key):
+        """Return the cached InputPeer for key, resolving it on first use"""
+        peer = self._peers.get(key) or self._from_session(key)
+        if peer is not None:
+            return peer
+        return await self.refresh(key, only_if_missing=True)
+
+    async def refresh(self, key, only_if_missing=False):
+        """Resolve key over the network and replace the cached InputPeer"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if only_if_missing and key in self._peers:
+                return self._peers[key]
+
+            entity = await self.bot.userbot.get_entity(key)
+            peer = utils.get_input_peer(entity)
+            self._peers[key] = peer
+            self._titles[key] = getattr(entity, 'title', None) or getattr(entity, 'username', None) or str(key)
+            return peer
+
+    async def call(self, key, func, *args, **kwargs):
+        """Call func(peer, ...) with the cached peer, refreshing it once if stale"""
+        peer = await self.get(key)
+        try:
+            return await func(peer, *args, **kwargs)
+        except STALE_PEER_ERRORS as e:
+            logger.warning(f"Cached peer for {key} is stale ({e}), refreshing")
+            peer = await self.refresh(key)
+            return await func(peer, *args, **kwargs)
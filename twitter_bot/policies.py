@@ -0,0 +1,193 @@
+"""
+Schedule policies - Precompiled cron/interval rules that generate posting slots
+"""
+
+import re
+from datetime import datetime, time as dtime, timedelta
+
+import numpy as np
+
+from config import TIMEZONE
+
+# How far ahead slots are generated
+HORIZON_DAYS = 30
+MINUTES_PER_DAY = 24 * 60
+
+# The three original posting modes
+BUILTIN_POLICIES = {
+    'hourly': {'title': '1 Hour', 'start': '07:00', 'every': '1h'},
+    'incremental': {'title': 'Now Send', 'start': '+2h', 'every': '1h'},
+    'two_hourly': {'title': '2 Hour', 'start': '07:00', 'every': '2h'},
+}
+
+_DURATION_PATTERN = re.compile(r'^(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?$')
+
+
+def parse_duration(text):
+    """Seconds in a duration such as 90m, 2h or 1h30m"""
+    match = _DURATION_PATTERN.match(text.strip().lower())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Invalid duration: {text}")
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60
+
+
+def _parse_clock(text):
+    hours, _, minutes = text.strip().partition(':')
+    value = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= value < MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time of day: {text}")
+    return value
+
+
+def parse_quiet_hours(text):
+    """Minute-of-day mask that is True inside quiet hours such as 23:00-06:00"""
+    mask = np.zeros(MINUTES_PER_DAY, dtype=bool)
+    if not text:
+        return mask
+
+    for window in text.split(','):
+        start_text, _, end_text = window.partition('-')
+        start, end = _parse_clock(start_text), _parse_clock(end_text)
+        if start <= end:
+            mask[start:end] = True
+        else:
+            # Window wraps past midnight
+            mask[start:] = True
+            mask[:end] = True
+    return mask
+
+
+def _cron_field(field, low, high):
+    """Boolean mask over low..high for one cron field (*, */n, a-b, a-b/n, lists)"""
+    mask = np.zeros(high + 1, dtype=bool)
+    for part in field.split(','):
+        spec, _, step_text = part.partition('/')
+        step = int(step_text) if step_text else 1
+        if spec == '*':
+            first, last = low, high
+        elif '-' in spec:
+            first, last = (int(value) for value in spec.split('-', 1))
+        else:
+            first = int(spec)
+            last = high if step_text else first
+        if not low <= first <= last <= high or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        mask[first:last + 1:step] = True
+    return mask
+
+
+class SchedulePolicy:
+    """A named rule producing candidate post times, compiled once into NumPy masks
+
+    Either cron ("minute hour day month weekday", weekday 0 = Sunday) or an
+    interval: every <duration> from start, where start is a local time of
+    day ("07:00", its next occurrence) or an offset from now ("+2h").
+    """
+
+    def __init__(self, name, title=None, cron=None, every=None, start=None, quiet_hours=''):
+        if bool(cron) == bool(every):
+            raise ValueError(f"Schedule policy {name} needs exactly one of cron or every")
+
+        self.name = name
+        self.title = title or name
+        self.cron = cron
+        self.every = every
+        self.start = start or '+0m'
+        self.quiet_hours = quiet_hours
+        self._quiet = parse_quiet_hours(quiet_hours)
+
+        if cron:
+            fields = cron.split()
+            if len(fields) != 5:
+                raise ValueError(f"Cron expression of policy {name} needs 5 fields: {cron}")
+            minutes = _cron_field(fields[0], 0, 59)
+            hours = _cron_field(fields[1], 0, 23)
+            self._days = _cron_field(fields[2], 1, 31)
+            self._months = _cron_field(fields[3], 1, 12)
+            weekdays = _cron_field(fields[4], 0, 7)
+            weekdays[0] |= weekdays[7]  # 7 is Sunday as well
+            self._weekdays = weekdays[:7]
+            self._any_day = fields[2] == '*'
+            self._any_weekday = fields[4] == '*'
+            # Minute-of-day mask, quiet hours already removed
+            self._day_minutes = np.flatnonzero(np.outer(hours[:24], minutes[:60]).ravel() & ~self._quiet)
+            if not len(self._day_minutes):
+                raise ValueError(f"Policy {name} has no slots outside quiet hours")
+            gaps = np.diff(np.append(self._day_minutes, self._day_minutes[0] + MINUTES_PER_DAY))
+            self.spacing = int(gaps.min()) * 60
+        else:
+            self.spacing = parse_duration(every)
+            if self.spacing < 60:
+                raise ValueError(f"Interval of policy {name} must be at least a minute")
+
+    @classmethod
+    def from_config(cls, name, spec, default_quiet_hours=''):
+        return cls(
+            name,
+            title=spec.get('title'),
+            cron=spec.get('cron'),
+            every=spec.get('every'),
+            start=spec.get('start'),
+            quiet_hours=spec.get('quiet_hours', default_quiet_hours)
+        )
+
+    def describe(self):
+        rule = f"cron `{self.cron}`" if self.cron else f"every {self.every} from {self.start}"
+        if self.quiet_hours:
+            rule += f", quiet {self.quiet_hours}"
+        return rule
+
+    def _day_starts(self, now, days):
+        """Epoch seconds of local midnight for today and the following days"""
+        today = now.astimezone(TIMEZONE).date()
+        return np.array([
+            TIMEZONE.localize(datetime.combine(today + timedelta(days=i), dtime())).timestamp()
+            for i in range(days + 1)
+        ], dtype=np.int64)
+
+    def _day_matches(self, now, days):
+        """Which of the next days pass the cron day, month and weekday fields"""
+        today = now.astimezone(TIMEZONE).date()
+        dates = [today + timedelta(days=i) for i in range(days + 1)]
+        day_ok = self._days[[d.day for d in dates]]
+        month_ok = self._months[[d.month for d in dates]]
+        weekday_ok = self._weekdays[[(d.weekday() + 1) % 7 for d in dates]]
+        if self._any_day or self._any_weekday:
+            return day_ok & weekday_ok & month_ok
+        # Standard cron: a restricted day-of-month OR a restricted weekday
+        return (day_ok | weekday_ok) & month_ok
+
+    def candidates(self, now=None, days=HORIZON_DAYS):
+        """Sorted epoch seconds of every slot in the horizon, quiet hours excluded"""
+        now = now or datetime.now(TIMEZONE)
+        day_starts = self._day_starts(now, days)
+
+        if self.cron:
+            starts = day_starts[self._day_matches(now, days)]
+            times = (starts[:, None] + self._day_minutes[None, :] * 60).ravel()
+        else:
+            if self.start.startswith('+'):
+                first = int(now.timestamp()) + parse_duration(self.start[1:])
+            else:
+                first = int(day_starts[0]) + _parse_clock(self.start) * 60
+                if first < now.timestamp():
+                    first += MINUTES_PER_DAY * 60
+            times = np.arange(first, int(day_starts[-1]) + MINUTES_PER_DAY * 60, self.spacing, dtype=np.int64)
+
+            # Minute of the local day of each candidate, for the quiet-hours mask
+            day_index = np.clip(np.searchsorted(day_starts, times, side='right') - 1, 0, len(day_starts) - 1)
+            minute_of_day = np.clip((times - day_starts[day_index]) // 60, 0, MINUTES_PER_DAY - 1)
+            times = times[~self._quiet[minute_of_day]]
+
+        return times[times > now.timestamp()]
+
+
+def load_policies(specs, default_quiet_hours=''):
+    """Built-in policies plus those configured in SCHEDULE_POLICIES"""
+    merged = dict(BUILTIN_POLICIES)
+    merged.update(specs or {})
+    return {
+        name: SchedulePolicy.from_config(name, spec, default_quiet_hours)
+        for name, spec in merged.items()
+    }
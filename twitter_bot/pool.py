@@ -0,0 +1,251 @@
+"""
+Userbot pool - Several accounts holding twittervid_bot conversations in parallel
+"""
+
+import asyncio
+import logging
+import time
+
+from telethon import TelegramClient, types
+from telethon.errors import FloodWaitError
+from telethon.sessions import StringSession
+
+from config import API_ID, API_HASH, TWITTER_VID_BOT, USERBOT_POOL_SESSIONS, USERBOT_STAGING_CHAT
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed downloads before an account is rested
+MAX_FAILURES = 3
+FAILURE_COOLDOWN = 300
+
+
+def _media_id(message):
+    """Server-side ID of a message's photo or document; the same for every account"""
+    media = message.document or message.photo
+    return media.id if media else None
+
+
+class UserbotAccount:
+    """One session and the state of its conversation with twittervid_bot"""
+
+    def __init__(self, name, client, primary=False):
+        self.name = name
+        self.client = client
+        self.primary = primary
+
+        self.busy = False
+        self.current_job = None
+        self.waiting_for_video = False
+        self.quality_selected = False
+        self.video_received = False
+        self.last_processed_message_id = None
+
+        self.assigned = 0
+        self.failures = 0
+        self.resting_until = 0.0
+
+    def healthy(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.client.is_connected() and self.resting_until <= now
+
+    def rest(self, seconds, reason):
+        self.resting_until = max(self.resting_until, time.monotonic() + seconds)
+        logger.warning(f"Userbot account {self.name} resting for {seconds}s: {reason}")
+
+    def record(self, ok):
+        """Track download outcomes; repeated failures rest the account"""
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= MAX_FAILURES:
+            self.failures = 0
+            self.rest(FAILURE_COOLDOWN, f"{MAX_FAILURES} failed downloads in a row")
+
+    def start_job(self, job):
+        self.current_job = job
+        self.waiting_for_video = True
+        self.quality_selected = False
+        self.video_received = False
+
+    def reset(self):
+        """Conversation finished; the account can take the next link"""
+        self.video_received = True
+        self.waiting_for_video = False
+        self.current_job = None
+        self.quality_selected = False
+
+
+class UserbotPool:
+    """The primary userbot plus optional download-only accounts
+
+    Channel posts always go through the primary account. Other accounts only
+    talk to twittervid_bot and forward the finished video to the staging chat,
+    where the primary account picks it up.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.accounts = []
+        self._changed = None
+
+    async def start(self):
+        """Wrap the primary userbot and connect the extra sessions"""
+        # Created here, on the running loop; each run attempt has its own loop
+        self._changed = asyncio.Condition()
+        self.accounts = [UserbotAccount('primary', self.bot.userbot, primary=True)]
+
+        if USERBOT_POOL_SESSIONS and not USERBOT_STAGING_CHAT:
+            logger.error("USERBOT_POOL_SESSIONS is set without USERBOT_STAGING_CHAT, using the primary account only")
+        elif USERBOT_POOL_SESSIONS and await self._check_staging_chat():
+            results = await asyncio.gather(
+                *(self._connect(i, session) for i, session in enumerate(USERBOT_POOL_SESSIONS, 1)),
+                return_exceptions=True
+            )
+            for i, result in enumerate(results, 1):
+                if isinstance(result, BaseException):
+                    logger.error(f"Userbot account pool-{i} unavailable: {str(result)}")
+                else:
+                    self.accounts.append(result)
+
+        for account in self.accounts:
+            self.bot.handlers.register_download_handler(account)
+        logger.info(f"Userbot pool ready with {len(self.accounts)} account(s)")
+
+    async def _check_staging_chat(self):
+        """Whether the staging chat is a channel or supergroup the primary account can see"""
+        try:
+            entity = await self.bot.userbot.get_entity(USERBOT_STAGING_CHAT)
+        except Exception as e:
+            logger.error(f"Cannot access USERBOT_STAGING_CHAT, using the primary account only: {str(e)}")
+            return False
+
+        if not (isinstance(entity, types.Channel) and (entity.broadcast or entity.megagroup)):
+            # Basic groups and private chats number messages per account, so a
+            # forwarded message's ID means nothing to the primary account
+            logger.error("USERBOT_STAGING_CHAT must be a channel or supergroup, using the primary account only")
+            return False
+
+        # get_entity stored it in the session, so this needs no further RPC
+        await self.bot.peers.get(USERBOT_STAGING_CHAT)
+        return True
+
+    async def _connect(self, index, session_string):
+        client = TelegramClient(StringSession(session_string), int(API_ID), API_HASH)
+        await client.connect()
+        if not await client.is_user_authorized():
+            await client.disconnect()
+            raise RuntimeError("session is not authorized")
+
+        me = await client.get_me()
+        # Resolve once so sends and forwards need no lookups later
+        await client.get_input_entity(TWITTER_VID_BOT)
+        await client.get_input_entity(USERBOT_STAGING_CHAT)
+        logger.info(f"Userbot account pool-{index} started as: {me.username} (ID: {me.id})")
+        return UserbotAccount(f"pool-{index}", client)
+
+    async def stop(self):
+        for account in self.accounts:
+            if not account.primary and account.client.is_connected():
+                await account.client.disconnect()
+
+    def has_idle(self):
+        now = time.monotonic()
+        # An account reserved by the pipeline but without a job is about to take the next link
+        return any(account.current_job is None and account.healthy(now) for account in self.accounts)
+
+    async def acquire(self):
+        """Least-loaded idle, healthy account; waits until one is free"""
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                idle = [a for a in self.accounts if not a.busy and a.healthy(now)]
+                if idle:
+                    account = min(idle, key=lambda a: (a.assigned, not a.primary))
+                    account.assigned += 1
+                    account.busy = True
+                    return account
+
+                resting = [a.resting_until - now for a in self.accounts if not a.busy and a.resting_until > now]
+                try:
+                    await asyncio.wait_for(self._changed.wait(), min(resting) if resting else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, account):
+        account.reset()
+        account.busy = False
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def send_link(self, account, text):
+        """Send a link to twittervid_bot from the account; flood waits rest the account and propagate"""
+        try:
+            if account.primary:
+                return await self.bot.dispatcher.send_message(TWITTER_VID_BOT, text)
+            return await account.client.send_message(TWITTER_VID_BOT, text)
+        except FloodWaitError as e:
+            account.rest(e.seconds, "flood wait")
+            raise
+
+    async def clear_history(self, account, before_id):
+        """Delete the account's older messages with twittervid_bot"""
+        if account.primary:
+            recent = await self.bot.dispatcher.call(
+                TWITTER_VID_BOT, self.bot.userbot.get_messages, limit=5, priority='housekeeping'
+            )
+        else:
+            recent = await account.client.get_messages(TWITTER_VID_BOT, limit=5)
+
+        old_ids = [old_msg.id for old_msg in recent if old_msg.id < before_id]
+        if not old_ids:
+            return
+        if account.primary:
+            await self.bot.dispatcher.call(
+                TWITTER_VID_BOT, self.bot.userbot.delete_messages, old_ids, priority='housekeeping'
+            )
+        else:
+            await account.client.delete_messages(TWITTER_VID_BOT, old_ids)
+
+    async def stage(self, account, message):
+        """The primary account's copy of a message another account received"""
+        if account.primary:
+            return message
+
+        try:
+            forwarded = await account.client.forward_messages(USERBOT_STAGING_CHAT, message)
+        except FloodWaitError as e:
+            account.rest(e.seconds, "flood wait")
+            raise
+        staged = await self.bot.dispatcher.call(USERBOT_STAGING_CHAT, self.bot.userbot.get_messages, ids=forwarded.id)
+        if staged is None:
+            raise RuntimeError(f"staged message {forwarded.id} is not visible to the primary account")
+        if _media_id(staged) != _media_id(forwarded):
+            raise RuntimeError(f"staged message {forwarded.id} does not carry the forwarded media")
+        return staged
+
+    async def unstage(self, account, message):
+        """Remove a staged copy once it has been posted"""
+        if account.primary:
+            return
+        try:
+            await self.bot.dispatcher.call(
+                USERBOT_STAGING_CHAT, self.bot.userbot.delete_messages, [message.id], priority='housekeeping'
+            )
+        except Exception as e:
+            logger.warning(f"Could not delete staged message {message.id}: {str(e)}")
+
+    def metrics(self):
+        """Prometheus text lines for each account"""
+        now = time.monotonic()
+        lines = [
+            "# TYPE userbot_account_busy gauge",
+            "# TYPE userbot_account_healthy gauge",
+            "# TYPE userbot_account_assigned_total counter",
+        ]
+        for account in self.accounts:
+            labels = f'account="{account.name}"'
+            lines.append(f'userbot_account_busy{{{labels}}} {int(account.current_job is not None)}')
+            lines.append(f'userbot_account_healthy{{{labels}}} {int(account.healthy(now))}')
+            lines.append(f'userbot_account_assigned_total{{{labels}}} {account.assigned}')
+        return "\n".join(lines) + "\n"
@@ -2,153 +2,312 @@
 Scheduler - Task scheduling functionality
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
+from telethon import functions, types
+from telethon.errors import MessageNotModifiedError
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from config import TIMEZONE
+from config import TIMEZONE, SCHEDULE_FILE, SCHEDULE_POLICIES, SCHEDULE_QUIET_HOURS
+from .policies import load_policies, HORIZON_DAYS
+from .slots import SlotCalendar
 
 logger = logging.getLogger(__name__)
 
+# Telegram rejects schedule dates that are (almost) now
+MIN_SCHEDULE_LEAD = timedelta(minutes=1)
 
-class ScheduleManager:
-    def __init__(self, bot):
-        self.bot = bot
+# /preview computes up to PREVIEW_MAX slots but lists only the first PREVIEW_LISTED
+PREVIEW_DEFAULT = 10
+PREVIEW_MAX = 1000
+PREVIEW_LISTED = 50
 
-    def _calculate_schedule_time(self):
-        """Calculate schedule time based on mode"""
-        now = datetime.now(TIMEZONE)
+# Start-menu buttons and legacy commands mapped to the built-in policies
+SCHEDULE_BUTTONS = {
+    'task_1hour': 'hourly',
+    'task2_nowsend': 'incremental',
+    'task3_2hour': 'two_hourly',
+}
 
-        if self.bot.scheduled_mode:
-            scheduled_time = now.replace(hour=7, minute=0, second=0, microsecond=0)
-            if scheduled_time < now:
-                scheduled_time += timedelta(days=1)
-            scheduled_time += timedelta(hours=self.bot.scheduled_counter)
 
-        elif self.bot.incremental_schedule_mode:
-            scheduled_time = now + timedelta(hours=self.bot.scheduled_counter + 2)
-
-        elif self.bot.fixed_interval_mode:
-            scheduled_time = now.replace(hour=7, minute=0, second=0, microsecond=0)
-            if scheduled_time < now:
-                scheduled_time += timedelta(days=1)
-            scheduled_time += timedelta(hours=2 * self.bot.scheduled_counter)
-
-        else:
-            scheduled_time = now
-
-        return scheduled_time
+class ScheduleManager:
+    def __init__(self, bot):
+        self.bot = bot
+        self.calendar = SlotCalendar(SCHEDULE_FILE)
+        self.policies = load_policies(SCHEDULE_POLICIES, SCHEDULE_QUIET_HOURS)
+
+        for target in bot.fanout.targets:
+            if target.policy and target.policy not in self.policies:
+                raise ValueError(f"Target {target.name} uses unknown schedule policy {target.policy}")
+
+    def is_active(self):
+        """Whether videos are currently being scheduled rather than posted now"""
+        return self.bot.schedule_policy is not None
+
+    def policy_for(self, target, policy_name=None):
+        """Policy a target follows under policy_name (default: the active one), None to post now"""
+        policy_name = policy_name or self.bot.schedule_policy
+        if not policy_name or not target.schedule:
+            return None
+        return self.policies[target.policy or policy_name]
+
+    def _policy_groups(self, targets, policy_name=None):
+        """Chats grouped by the policy they follow; each group shares one slot"""
+        groups = {}
+        for target in targets:
+            policy = self.policy_for(target, policy_name)
+            if policy:
+                groups.setdefault(policy.name, (policy, []))[1].append(target.chat_id)
+        return list(groups.values())
+
+    def reserve_slots(self, targets):
+        """Claim the next video's slot for every scheduled target: {chat_id: datetime}"""
+        slots = {}
+        for policy, chat_ids in self._policy_groups(targets):
+            t = self.calendar.reserve(chat_ids, policy.candidates(), policy.spacing)
+            if t is None:
+                self.release_slots(slots)
+                raise ValueError(f"No free {policy.title} slot in the next {HORIZON_DAYS} days")
+            for chat_id in chat_ids:
+                slots[chat_id] = datetime.fromtimestamp(t, TIMEZONE)
+        return slots
+
+    def release_slots(self, slots):
+        """Free reserved slots of chats where the post was not scheduled"""
+        for chat_id, scheduled_time in slots.items():
+            self.calendar.release([chat_id], int(scheduled_time.timestamp()))
+
+    def preview(self, policy_name, count):
+        """Next count free slots under a policy, for the chats that follow it"""
+        policy = self.policies[policy_name]
+        chat_ids = [
+            target.chat_id for target in self.bot.fanout.targets
+            if self.policy_for(target, policy_name) is policy
+        ]
+        times = self.calendar.preview(chat_ids, policy.candidates(), policy.spacing, count)
+        return [datetime.fromtimestamp(t, TIMEZONE) for t in times]
+
+    async def reconcile(self):
+        """Rebuild the slot calendar and scheduled_messages from Telegram's scheduled queues
+
+        Each chat's whole queue comes back in one GetScheduledHistory call, and
+        all chats are queried concurrently. A chat that cannot be read keeps
+        its locally saved slots; slots of jobs still sending are always kept.
+        """
+        chat_ids = [target.chat_id for target in self.bot.fanout.targets]
+        results = await asyncio.gather(*(self._fetch_scheduled(chat_id) for chat_id in chat_ids), return_exceptions=True)
+
+        scheduled_messages = []
+        for chat_id, messages in zip(chat_ids, results):
+            if isinstance(messages, BaseException):
+                logger.error(f"Could not read scheduled messages of {chat_id}, keeping saved slots: {str(messages)}")
+                continue
+
+            self.calendar.replace(chat_id, [m.date.timestamp() for m in messages])
+            scheduled_messages.extend(m.id for m in messages)
+            logger.info(f"{len(messages)} scheduled post(s) pending in {self.bot.peers.title(chat_id)}")
+
+        self.bot.scheduled_messages = scheduled_messages
+
+    async def _fetch_scheduled(self, chat_id):
+        """All messages currently in a chat's scheduled queue"""
+        result = await self.bot.dispatcher.call(
+            chat_id,
+            lambda peer: self.bot.userbot(functions.messages.GetScheduledHistoryRequest(peer=peer, hash=0)),
+            priority='housekeeping'
+        )
+        return [m for m in getattr(result, 'messages', []) if isinstance(m, types.Message)]
 
-    async def start_task(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Start scheduled posting mode"""
+    async def shift_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Move every pending scheduled post by a number of hours"""
         if not await self.bot.handlers.admin_only(update, context):
             return
 
-        await self._start_task_common(update, context)
+        try:
+            hours = float(context.args[0])
+        except (IndexError, ValueError):
+            await update.message.reply_text("Usage: /shift <hours>, e.g. /shift 3 or /shift -1.5")
+            return
 
-    async def start_task_callback(self, query, context: ContextTypes.DEFAULT_TYPE):
-        """Start scheduled posting mode from callback"""
-        await self._start_task_common(query, context, is_callback=True)
+        delta = timedelta(hours=hours)
+        await self._bulk_reschedule(update, f"Shift by {hours:+g}h", lambda times: {t: t + delta for t in times})
 
-    async def start_task2(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Start incremental scheduled posting mode"""
+    async def respace_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Repack pending scheduled posts at a fixed gap, starting from the first one"""
         if not await self.bot.handlers.admin_only(update, context):
             return
 
-        await self._start_task2_common(update, context)
+        try:
+            minutes = float(context.args[0])
+            if minutes <= 0:
+                raise ValueError
+        except (IndexError, ValueError):
+            await update.message.reply_text("Usage: /respace <minutes>, e.g. /respace 90")
+            return
 
-    async def start_task2_callback(self, query, context: ContextTypes.DEFAULT_TYPE):
-        """Start incremental scheduled posting mode from callback"""
-        await self._start_task2_common(query, context, is_callback=True)
+        gap = timedelta(minutes=minutes)
 
-    async def start_task3(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Start fixed 2-hour interval scheduling mode"""
-        if not await self.bot.handlers.admin_only(update, context):
-            return
+        def plan(times):
+            if not times:
+                return {}
+            ordered = sorted(times)
+            start = max(ordered[0], datetime.now(TIMEZONE) + MIN_SCHEDULE_LEAD)
+            return {t: start + i * gap for i, t in enumerate(ordered)}
 
-        await self._start_task3_common(update, context)
+        await self._bulk_reschedule(update, f"Respace at {minutes:g} min", plan)
 
-    async def start_task3_callback(self, query, context: ContextTypes.DEFAULT_TYPE):
-        """Start fixed 2-hour interval scheduling mode from callback"""
-        await self._start_task3_common(query, context, is_callback=True)
+    async def _bulk_reschedule(self, update, label, plan):
+        """Re-time every scheduled post of every target chat, reporting in one status message
 
-    async def _start_task_common(self, update, context: ContextTypes.DEFAULT_TYPE, is_callback=False):
-        """Common function for starting task mode"""
-        self.bot.scheduled_mode = True
-        self.bot.incremental_schedule_mode = False
-        self.bot.fixed_interval_mode = False
-        self.bot.scheduled_counter = 0
-        self.bot.scheduled_messages = []
+        plan maps the set of current post times to their new times; posts sharing a
+        time in different channels therefore stay together.
+        """
+        status = self.bot.status_board.open(update.message, f"⏳ {label}: reading scheduled posts...")
 
-        now = datetime.now(TIMEZONE)
-        first_schedule_time = now.replace(hour=7, minute=0, second=0, microsecond=0)
+        chat_ids = [target.chat_id for target in self.bot.fanout.targets]
+        results = await asyncio.gather(*(self._fetch_scheduled(chat_id) for chat_id in chat_ids), return_exceptions=True)
+        queues = {}
+        for chat_id, messages in zip(chat_ids, results):
+            if isinstance(messages, BaseException):
+                logger.error(f"Could not read scheduled messages of {chat_id}: {str(messages)}")
+            else:
+                queues[chat_id] = messages
 
-        if first_schedule_time < now:
-            first_schedule_time += timedelta(days=1)
+        if not queues:
+            status.update(f"❌ {label}: could not read the scheduled posts.")
+            return
 
-        response_text = (
-            "📅 **1 Hour Mode Activated!**\n\n"
-            f"⏰ First video: {first_schedule_time.strftime('%Y-%m-%d %H:%M')} IST\n"
-            f"🕐 Each new video: +1 hour interval\n\n"
-            "❌ Use /endtask to stop scheduled posting."
-        )
+        mapping = plan({m.date for messages in queues.values() for m in messages})
+        if not mapping:
+            status.update(f"ℹ️ {label}: there are no scheduled posts.")
+            return
+        if min(mapping.values()) < datetime.now(TIMEZONE) + MIN_SCHEDULE_LEAD:
+            status.update(f"❌ {label}: that would move posts into the past, nothing changed.")
+            return
 
-        if is_callback:
-            await update.edit_message_text(response_text)
+        edits = {
+            chat_id: [(m.id, mapping[m.date]) for m in messages if mapping[m.date] != m.date]
+            for chat_id, messages in queues.items()
+        }
+        total = sum(len(chat_edits) for chat_edits in edits.values())
+        progress = {'done': 0, 'failed': 0}
+
+        def show():
+            # Coalesced by the status board, so calling this per post is cheap
+            text = f"⏳ {label}: {progress['done']}/{total} posts moved"
+            if progress['failed']:
+                text += f", {progress['failed']} failed"
+            status.update(text)
+
+        async def run_chat(chat_id, chat_edits):
+            # Sequential per chat; chats proceed in parallel
+            for message_id, when in chat_edits:
+                try:
+                    await self._edit_schedule(chat_id, message_id, when)
+                    progress['done'] += 1
+                except Exception as e:
+                    progress['failed'] += 1
+                    logger.error(f"Could not reschedule message {message_id} in {chat_id}: {str(e)}")
+                show()
+
+        await asyncio.gather(*(run_chat(chat_id, chat_edits) for chat_id, chat_edits in edits.items()))
+        await self.reconcile()
+
+        summary = f"✅ {label}: {progress['done']}/{total} posts moved"
+        if progress['failed']:
+            summary += f", {progress['failed']} failed"
+        first = min(mapping.values()).astimezone(TIMEZONE)
+        last = max(mapping.values()).astimezone(TIMEZONE)
+        summary += f"\n📅 Now {first.strftime('%Y-%m-%d %H:%M')} to {last.strftime('%Y-%m-%d %H:%M')} IST"
+        status.update(summary)
+
+    async def _edit_schedule(self, chat_id, message_id, when):
+        """Set a scheduled message's date; the dispatcher sits out flood waits"""
+        try:
+            await self.bot.dispatcher.call(
+                chat_id,
+                lambda peer: self.bot.userbot(functions.messages.EditMessageRequest(
+                    peer=peer, id=message_id, schedule_date=when
+                )),
+                priority='housekeeping'
+            )
+        except MessageNotModifiedError:
+            pass
+
+    def command_for(self, policy_name):
+        """Command handler that activates one policy, e.g. /task"""
+        async def command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            if not await self.bot.handlers.admin_only(update, context):
+                return
+            await self.activate(update, policy_name)
+        return command
+
+    async def schedule_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """List policies, or switch with /schedule <policy> and /schedule off"""
+        if not await self.bot.handlers.admin_only(update, context):
+            return
+
+        if not context.args:
+            lines = ["🗓️ **Schedule policies**\n"]
+            for name, policy in self.policies.items():
+                marker = "▶️" if name == self.bot.schedule_policy else "•"
+                lines.append(f"{marker} `{name}` - {policy.title}: {policy.describe()}")
+            lines.append("\nUse /schedule <policy> to activate, /schedule off to post immediately.")
+            await update.message.reply_text("\n".join(lines))
+            return
+
+        name = context.args[0].lower()
+        if name == 'off':
+            await self.end_task(update, context)
+        elif name not in self.policies:
+            await update.message.reply_text(f"❌ Unknown policy `{name}`. Use /schedule to list them.")
         else:
-            await update.message.reply_text(response_text)
+            await self.activate(update, name)
 
-    async def _start_task2_common(self, update, context: ContextTypes.DEFAULT_TYPE, is_callback=False):
-        """Common function for starting task2 mode"""
-        self.bot.incremental_schedule_mode = True
-        self.bot.scheduled_mode = False
-        self.bot.fixed_interval_mode = False
-        self.bot.scheduled_counter = 0
-        self.bot.scheduled_messages = []
+    async def preview_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the next free slots: /preview [count] [policy]"""
+        if not await self.bot.handlers.admin_only(update, context):
+            return
 
-        now = datetime.now(TIMEZONE)
-        first_schedule_time = now + timedelta(hours=2)
+        count = PREVIEW_DEFAULT
+        policy_name = self.bot.schedule_policy
+        for arg in context.args or []:
+            if arg.isdigit():
+                count = min(int(arg), PREVIEW_MAX)
+            else:
+                policy_name = arg.lower()
 
-        response_text = (
-            "⏱️ **Now Send Mode Activated!**\n\n"
-            f"⏰ First video: {first_schedule_time.strftime('%Y-%m-%d %H:%M')} IST\n"
-            f"🕐 Next intervals: +2h, +3h, +4h...\n\n"
-            "❌ Use /endtask to stop scheduled posting."
-        )
+        if policy_name not in self.policies:
+            await update.message.reply_text("Usage: /preview [count] [policy]; no policy is active.")
+            return
 
-        if is_callback:
-            await update.edit_message_text(response_text)
-        else:
-            await update.message.reply_text(response_text)
+        slots = self.preview(policy_name, count)
+        if not slots:
+            await update.message.reply_text(f"ℹ️ No free {policy_name} slots in the next {HORIZON_DAYS} days.")
+            return
+
+        shown = slots[:PREVIEW_LISTED]
+        lines = [f"📅 **Next {len(slots)} {self.policies[policy_name].title} slots**\n"]
+        lines += [f"• {slot.strftime('%a %Y-%m-%d %H:%M')}" for slot in shown]
+        if len(slots) > len(shown):
+            lines.append(f"… and {len(slots) - len(shown)} more, last at {slots[-1].strftime('%Y-%m-%d %H:%M')}")
+        await update.message.reply_text("\n".join(lines))
 
-    async def _start_task3_common(self, update, context: ContextTypes.DEFAULT_TYPE, is_callback=False):
-        """Common function for starting task3 mode"""
-        self.bot.fixed_interval_mode = True
-        self.bot.scheduled_mode = False
-        self.bot.incremental_schedule_mode = False
+    async def activate(self, update, policy_name, is_callback=False):
+        """Switch scheduling to a policy and show where the next videos will go"""
+        self.bot.schedule_policy = policy_name
         self.bot.scheduled_counter = 0
-        self.bot.scheduled_messages = []
-
-        now = datetime.now(TIMEZONE)
-        first_schedule_time = now.replace(hour=7, minute=0, second=0, microsecond=0)
-
-        if first_schedule_time < now:
-            first_schedule_time += timedelta(days=1)
-
-        second_schedule_time = first_schedule_time + timedelta(hours=2)
-        third_schedule_time = first_schedule_time + timedelta(hours=4)
-
-        response_text = (
-            "🕑 **2 Hour Mode Activated!**\n\n"
-            f"⏰ Schedule starts at: 7:00 AM IST\n"
-            f"🕐 Fixed interval: Every 2 hours\n\n"
-            f"📅 Example schedule:\n"
-            f"• 1st post: {first_schedule_time.strftime('%H:%M')} IST\n"
-            f"• 2nd post: {second_schedule_time.strftime('%H:%M')} IST\n"
-            f"• 3rd post: {third_schedule_time.strftime('%H:%M')} IST\n\n"
-            "❌ Use /endtask to stop scheduled posting."
-        )
+        policy = self.policies[policy_name]
+
+        upcoming = self.preview(policy_name, 3)
+        lines = [f"📅 **{policy.title} Mode Activated!**\n", f"🕐 Rule: {policy.describe()}"]
+        if upcoming:
+            lines.append("📅 Next slots:")
+            lines += [f"• {slot.strftime('%Y-%m-%d %H:%M')} IST" for slot in upcoming]
+        lines.append("\n❌ Use /endtask to stop scheduled posting.")
+        response_text = "\n".join(lines)
 
         if is_callback:
             await update.edit_message_text(response_text)
@@ -160,9 +319,7 @@ class ScheduleManager:
         if not await self.bot.handlers.admin_only(update, context):
             return
 
-        self.bot.scheduled_mode = False
-        self.bot.incremental_schedule_mode = False
-        self.bot.fixed_interval_mode = False
+        self.bot.schedule_policy = None
 
         await update.message.reply_text(
             "🚫 **Scheduled Mode Deactivated!**\n\n"
@@ -172,4 +329,3 @@ class ScheduleManager:
         )
 
         self.bot.scheduled_counter = 0
-        self.bot.scheduled_messages = []
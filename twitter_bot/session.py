@@ -0,0 +1,44 @@
+"""
+Session backends - String or persistent SQLite session for the userbot
+"""
+
+import logging
+import os
+from telethon.sessions import SQLiteSession, StringSession
+
+from config import TELEGRAM_SESSION_STRING, TELEGRAM_SESSION_BACKEND, TELEGRAM_SESSION_FILE
+
+logger = logging.getLogger(__name__)
+
+
+def build_session():
+    """Create the configured Telethon session, bootstrapped from TELEGRAM_SESSION_STRING"""
+    if TELEGRAM_SESSION_BACKEND != 'sqlite':
+        return StringSession(TELEGRAM_SESSION_STRING)
+
+    session_dir = os.path.dirname(TELEGRAM_SESSION_FILE)
+    if session_dir:
+        os.makedirs(session_dir, exist_ok=True)
+
+    session = SQLiteSession(TELEGRAM_SESSION_FILE)
+
+    if TELEGRAM_SESSION_STRING:
+        bootstrap = StringSession(TELEGRAM_SESSION_STRING)
+        current_key = session.auth_key.key if session.auth_key else None
+
+        # Only (re)seed when the file is new or the configured account changed,
+        # otherwise the cached entities and update state are kept
+        if bootstrap.auth_key and bootstrap.auth_key.key != current_key:
+            if current_key is not None:
+                # Access hashes are per account, so stale entities must go too
+                logger.info("Session string changed, discarding old persistent session")
+                session.delete()
+                session = SQLiteSession(TELEGRAM_SESSION_FILE)
+
+            logger.info("Seeding persistent session from TELEGRAM_SESSION_STRING")
+            session.set_dc(bootstrap.dc_id, bootstrap.server_address, bootstrap.port)
+            session.auth_key = bootstrap.auth_key
+            session.save()
+
+    logger.info(f"Using persistent SQLite session: {session.filename}")
+    return session
@@ -0,0 +1,124 @@
+"""
+Slot calendar - Persistent per-channel index of reserved schedule times
+"""
+
+import bisect
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SlotCalendar:
+    """Sorted schedule times per chat, saved to disk after every change
+
+    A candidate time t is free in a chat when no reservation lies strictly
+    within one policy spacing of it, so policies of different spacing never overlap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._slots = self._load()
+        # Reserved this run but not yet seen in Telegram's scheduled queue
+        self._pending = {}
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            slots = {int(chat_id): sorted(times) for chat_id, times in data.items()}
+            logger.info(f"Loaded {sum(len(t) for t in slots.values())} reserved schedule slot(s)")
+            return slots
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read schedule calendar, starting empty: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(chat_id): times for chat_id, times in self._slots.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def prune(self, now=None):
+        """Forget slots that are already in the past"""
+        now = time.time() if now is None else now
+        for slots in (self._slots, self._pending):
+            for chat_id, times in slots.items():
+                del times[:bisect.bisect_left(times, now)]
+
+    def times(self, chat_id):
+        """Reserved times of a chat, ascending"""
+        return list(self._slots.get(chat_id, ()))
+
+    def free_mask(self, chat_ids, candidates, spacing):
+        """Vectorized: which candidate times are free in every chat"""
+        free = np.ones(len(candidates), dtype=bool)
+        for chat_id in chat_ids:
+            times = np.asarray(self._slots.get(chat_id, ()), dtype=np.int64)
+            if not len(times):
+                continue
+            # First reservation after t - spacing; free if it is not before t + spacing
+            i = np.searchsorted(times, candidates - spacing, side='right')
+            following = times[np.minimum(i, len(times) - 1)]
+            free &= (i == len(times)) | (following >= candidates + spacing)
+        return free
+
+    def preview(self, chat_ids, candidates, spacing, count):
+        """The next count slots that successive reservations would get"""
+        self.prune()
+        free = candidates[self.free_mask(chat_ids, candidates, spacing)]
+        picks = []
+        i = 0
+        while i < len(free) and len(picks) < count:
+            picks.append(int(free[i]))
+            # Skip candidates the pick itself would now block
+            i = int(np.searchsorted(free, free[i] + spacing, side='left'))
+        return picks
+
+    def reserve(self, chat_ids, candidates, spacing):
+        """Claim the first free candidate in every chat; returns its timestamp or None
+
+        Runs without awaiting, so concurrent jobs on the event loop can never
+        be handed the same slot.
+        """
+        picks = self.preview(chat_ids, candidates, spacing, 1)
+        if not picks:
+            return None
+
+        t = picks[0]
+        for chat_id in chat_ids:
+            bisect.insort(self._slots.setdefault(chat_id, []), t)
+            bisect.insort(self._pending.setdefault(chat_id, []), t)
+        self._save()
+        return t
+
+    def release(self, chat_ids, t):
+        """Give back a slot whose posts were never scheduled"""
+        for chat_id in chat_ids:
+            for times in (self._slots.get(chat_id, []), self._pending.get(chat_id, [])):
+                i = bisect.bisect_left(times, t)
+                if i < len(times) and times[i] == t:
+                    del times[i]
+        self._save()
+
+    def replace(self, chat_id, times):
+        """Set a chat's slots to what Telegram reports as scheduled
+
+        Reservations whose posts are still being sent are kept, so no other job
+        can be handed their time.
+        """
+        scheduled = {int(t) for t in times}
+        pending = [t for t in self._pending.get(chat_id, ()) if t not in scheduled]
+        self._pending[chat_id] = pending
+        self._slots[chat_id] = sorted(scheduled.union(pending))
+        self._save()
@@ -0,0 +1,55 @@
+"""
+Startup graph - Concurrent component initialization with dependencies
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupGraph:
+    """Run start-up steps concurrently, each one waiting only for its dependencies"""
+
+    def __init__(self):
+        self._steps = {}
+        self.timings = {}
+
+    def add(self, name, func, depends_on=()):
+        """Register an async step; depends_on names steps that must finish first"""
+        self._steps[name] = (func, tuple(depends_on))
+
+    async def run(self):
+        """Run every step and return their results keyed by step name"""
+        for name, (_, deps) in self._steps.items():
+            missing = [dep for dep in deps if dep not in self._steps]
+            if missing:
+                raise ValueError(f"Startup step '{name}' depends on unknown steps: {missing}")
+
+        tasks = {}
+
+        async def run_step(name):
+            func, deps = self._steps[name]
+            if deps:
+                await asyncio.gather(*(tasks[dep] for dep in deps))
+
+            started_at = time.monotonic()
+            result = await func()
+            self.timings[name] = time.monotonic() - started_at
+            logger.info(f"Startup step '{name}' finished in {self.timings[name]:.2f}s")
+            return result
+
+        # Tasks only start running at the next await, so every entry exists by then
+        for name in self._steps:
+            tasks[name] = asyncio.create_task(run_step(name), name=f"startup:{name}")
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return dict(zip(tasks.keys(), results))
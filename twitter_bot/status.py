@@ -0,0 +1,113 @@
+"""
+Status messages - Live admin status messages, edited at a capped overall rate
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class StatusMessage:
+    """One admin-facing message per job or batch; update() only records the latest text"""
+
+    def __init__(self, board, reply_to):
+        self._board = board
+        self._reply_to = reply_to
+        self._message = None
+        self._pending = None
+        self._shown = None
+
+    def update(self, text):
+        """Show text soon; updates arriving before the next edit replace each other"""
+        self._pending = text
+        self._board._mark(self)
+
+    async def _flush(self):
+        """Send or edit the message with the newest text; returns seconds Telegram wants us to wait"""
+        text, self._pending = self._pending, None
+        if text is None or text == self._shown:
+            return 0
+
+        try:
+            if self._message is None:
+                self._message = await self._reply_to.reply_text(text)
+            else:
+                await self._message.edit_text(text)
+            self._shown = text
+        except RetryAfter as e:
+            # Keep the newest text queued unless something newer arrived meanwhile
+            if self._pending is None:
+                self.update(text)
+            return e.retry_after
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning(f"Could not update status message: {e}")
+            self._shown = text
+        except Exception as e:
+            logger.warning(f"Could not update status message: {e}")
+        return 0
+
+
+class StatusBoard:
+    """Flushes dirty status messages one at a time, so admin chat traffic stays at one call per interval
+
+    Messages are served in the order they became dirty, which keeps every job's
+    message moving no matter how many are active.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._dirty = OrderedDict()
+        self._wake = None
+        self._task = None
+        self._stopped = True
+
+    async def start(self):
+        """Start flushing on the running loop; each run attempt has its own loop"""
+        self._wake = asyncio.Event()
+        self._stopped = False
+        if self._dirty:
+            self._mark(next(iter(self._dirty)))
+
+    def open(self, reply_to, text=None):
+        """New status message replying to reply_to, sent once it has text"""
+        status = StatusMessage(self, reply_to)
+        if text:
+            status.update(text)
+        return status
+
+    def _mark(self, status):
+        # Already-dirty messages keep their place in line
+        self._dirty.setdefault(status, None)
+        if self._stopped:
+            return
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="status-board")
+
+    async def _run(self):
+        while True:
+            if not self._dirty:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            status, _ = self._dirty.popitem(last=False)
+            retry_after = await status._flush()
+            await asyncio.sleep(max(self.interval, retry_after))
+
+    async def stop(self):
+        """Flush what is pending once, ignoring the rate cap, then stop"""
+        self._stopped = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        pending = list(self._dirty)
+        self._dirty.clear()
+        for status in pending:
+            await status._flush()
@@ -0,0 +1,236 @@
+"""
+Transcoder - Background ffmpeg jobs that fit videos into Twitter's media limits
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import ffmpeg
+
+from config import TRANSCODE_WORKERS, TRANSCODE_QUEUE_SIZE, TRANSCODE_CACHE_DIR, TRANSCODE_CACHE_MB
+
+logger = logging.getLogger(__name__)
+
+# Limits of a tweet_video upload
+MAX_DURATION = 140
+MAX_BYTES = 512 * 1024 * 1024
+MAX_WIDTH = 1920
+MAX_HEIGHT = 1200
+MAX_FPS = 60
+
+# Re-encode targets, well inside the limits above
+TARGET_BOX = 1280
+TARGET_VIDEO_BITRATE = 5000 * 1000
+AUDIO_BITRATE = 128 * 1000
+
+
+def needs_transcode_hint(file):
+    """Guess from Telegram metadata alone whether a video cannot be posted as is"""
+    if not file or not file.mime_type or not file.mime_type.startswith('video/'):
+        return False
+    return (
+        file.mime_type != 'video/mp4'
+        or (file.size or 0) > MAX_BYTES
+        or (file.duration or 0) > MAX_DURATION
+        or (file.width or 0) > MAX_WIDTH
+        or (file.height or 0) > MAX_HEIGHT
+    )
+
+
+def file_digest(path):
+    """SHA-256 of a file, used as the transcode cache key"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _frame_rate(stream):
+    num, _, den = stream.get('avg_frame_rate', '0/1').partition('/')
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _is_compatible(probe, size):
+    video = next((s for s in probe['streams'] if s['codec_type'] == 'video'), None)
+    audio = next((s for s in probe['streams'] if s['codec_type'] == 'audio'), None)
+    duration = float(probe['format'].get('duration', 0))
+
+    return (
+        video is not None
+        and video.get('codec_name') == 'h264'
+        and video.get('pix_fmt') == 'yuv420p'
+        and (audio is None or audio.get('codec_name') == 'aac')
+        and int(video.get('width', 0)) <= MAX_WIDTH
+        and int(video.get('height', 0)) <= MAX_HEIGHT
+        and _frame_rate(video) <= MAX_FPS
+        and duration <= MAX_DURATION
+        and size <= MAX_BYTES
+    )
+
+
+def transcode_job(source_path, output_path):
+    """Re-encode source_path to Twitter-compatible H.264/AAC (runs in a worker process)
+
+    Returns the path to post: output_path, or source_path when it already complies.
+    """
+    probe = ffmpeg.probe(source_path)
+    if _is_compatible(probe, os.path.getsize(source_path)):
+        return source_path
+
+    duration = min(float(probe['format'].get('duration', MAX_DURATION)), MAX_DURATION)
+    has_audio = any(s['codec_type'] == 'audio' for s in probe['streams'])
+
+    # Stay under the byte limit even for the full 140 seconds, with 5% headroom
+    size_bitrate = int(MAX_BYTES * 8 * 0.95 / max(duration, 1)) - AUDIO_BITRATE
+    video_bitrate = min(TARGET_VIDEO_BITRATE, size_bitrate)
+
+    source = ffmpeg.input(source_path)
+    video = (
+        source.video
+        .filter('scale', TARGET_BOX, TARGET_BOX, force_original_aspect_ratio='decrease')
+        .filter('scale', 'trunc(iw/2)*2', 'trunc(ih/2)*2')
+    )
+    source_video = next(s for s in probe['streams'] if s['codec_type'] == 'video')
+    if _frame_rate(source_video) > MAX_FPS:
+        video = video.filter('fps', fps=MAX_FPS)
+    streams = [video, source.audio] if has_audio else [video]
+
+    audio_options = {'acodec': 'aac', 'audio_bitrate': AUDIO_BITRATE, 'ac': 2} if has_audio else {}
+    tmp_path = f"{output_path}.part.mp4"
+    (
+        ffmpeg
+        .output(
+            *streams,
+            tmp_path,
+            t=MAX_DURATION,
+            vcodec='libx264',
+            preset='veryfast',
+            pix_fmt='yuv420p',
+            video_bitrate=video_bitrate,
+            maxrate=video_bitrate,
+            bufsize=video_bitrate * 2,
+            movflags='+faststart',
+            **audio_options
+        )
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class Transcoder:
+    """Queue of ffmpeg jobs executed in a process pool, cached by source hash"""
+
+    def __init__(self):
+        self._executor = None
+        self._queue = None
+        self._workers = []
+        self._inflight = {}
+
+    async def start(self):
+        """Start the process pool and the queue workers"""
+        if self._workers:
+            return
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS)
+        self._queue = asyncio.Queue(maxsize=TRANSCODE_QUEUE_SIZE)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"transcode-{i}")
+            for i in range(TRANSCODE_WORKERS)
+        ]
+        logger.info(f"Transcoder started with {TRANSCODE_WORKERS} worker process(es)")
+
+    async def stop(self):
+        """Stop the queue workers; the process pool is kept for a restart"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _run_cpu(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _worker(self):
+        while True:
+            func, args, future = await self._queue.get()
+            try:
+                result = await self._run_cpu(func, *args)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def submit(self, func, *args):
+        """Run a module-level job in the process pool through the bounded queue"""
+        if not self._workers:
+            raise RuntimeError("Transcoder is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, future))
+        return await future
+
+    async def prepare(self, source_path):
+        """Return a path that satisfies Twitter's video limits, transcoding if needed
+
+        Falls back to the original file when ffmpeg is unavailable or fails.
+        """
+        if not self._workers:
+            return source_path
+
+        try:
+            digest = await self._run_cpu(file_digest, source_path)
+            output_path = os.path.join(TRANSCODE_CACHE_DIR, f"{digest}.mp4")
+            if os.path.exists(output_path):
+                logger.info(f"Using cached transcode {digest[:12]}")
+                os.utime(output_path)
+                return output_path
+
+            future = self._inflight.get(digest)
+            if future is None:
+                os.makedirs(TRANSCODE_CACHE_DIR, exist_ok=True)
+                future = asyncio.ensure_future(self.submit(transcode_job, source_path, output_path))
+                self._inflight[digest] = future
+                future.add_done_callback(lambda _: self._inflight.pop(digest, None))
+
+            result = await asyncio.shield(future)
+            if result == output_path:
+                logger.info(f"Transcoded video for Twitter ({os.path.getsize(result) / (1024 * 1024):.2f}MB)")
+                prune_cache_dir(TRANSCODE_CACHE_DIR, TRANSCODE_CACHE_MB * 1024 * 1024)
+            return result
+
+        except Exception as e:
+            logger.error(f"Transcoding failed, posting original video: {str(e)}")
+            return source_path
+
+
+def prune_cache_dir(directory, limit):
+    """Delete the least recently used finished .mp4 outputs beyond limit bytes"""
+    files = []
+    for name in os.listdir(directory):
+        file_path = os.path.join(directory, name)
+        if name.endswith('.mp4') and '.part' not in name:
+            stat = os.stat(file_path)
+            files.append((stat.st_mtime, stat.st_size, file_path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, file_path in sorted(files):
+        if total <= limit:
+            break
+        try:
+            os.remove(file_path)
+            total -= size
+        except OSError as e:
+            logger.warning(f"Could not prune cached output {file_path}: {e}")
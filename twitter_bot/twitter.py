@@ -2,38 +2,77 @@
 Twitter integration - Twitter client and posting functionality
 """
 
+import asyncio
+import functools
 import logging
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from tweepy import Client as TwitterClient, OAuth1UserHandler, API
-from tweepy.errors import TweepyException
+from tweepy.errors import TweepyException, Unauthorized
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from config import (
     TWITTER_BEARER_TOKEN, TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET,
-    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_SECRET
+    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_SECRET, TWITTER_IO_WORKERS
 )
+from .media_upload import ChunkedUploader
 
 logger = logging.getLogger(__name__)
 
+# Twitter closes keep-alive connections after a few idle minutes
+KEEPALIVE_IDLE_SECONDS = 240
+
+
+class TwitterUnavailable(Exception):
+    """The poster has no usable client, e.g. after Twitter rejected the credentials"""
+
 
 class TwitterPoster:
     def __init__(self):
         self.twitter_client = None
+        self.legacy_api = None
+        self._last_request_at = 0
+        # tweepy calls submitted to the I/O pool and not yet finished
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        # tweepy is synchronous, so its calls run here instead of on the event loop
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=TWITTER_IO_WORKERS,
+            thread_name_prefix="twitter-io"
+        )
+        self.uploader = ChunkedUploader(self)
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = None
+
+    async def _run_io(self, func, *args, **kwargs):
+        """Run a blocking tweepy call in the Twitter I/O thread pool"""
+        loop = asyncio.get_running_loop()
+        # Counted until the thread finishes, even if the awaiting task is cancelled
+        with self._in_flight_lock:
+            self._in_flight += 1
+        return await loop.run_in_executor(self._io_executor, self._tracked, functools.partial(func, *args, **kwargs))
+
+    def _tracked(self, call):
+        try:
+            return call()
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+                self._last_request_at = time.monotonic()
 
     async def initialize_twitter_client(self):
         """Initialize Twitter client"""
         try:
             if all([TWITTER_BEARER_TOKEN, TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET,
                     TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_SECRET]):
-                self.twitter_client = TwitterClient(
-                    bearer_token=TWITTER_BEARER_TOKEN,
-                    consumer_key=TWITTER_CONSUMER_KEY,
-                    consumer_secret=TWITTER_CONSUMER_SECRET,
-                    access_token=TWITTER_ACCESS_TOKEN,
-                    access_token_secret=TWITTER_ACCESS_SECRET
-                )
+                self._build_clients()
 
                 logger.info("Twitter client initialized successfully")
                 return True
@@ -45,6 +84,64 @@ class TwitterPoster:
             logger.error(f"Failed to initialize Twitter client: {str(e)}")
             return False
 
+    def _build_clients(self):
+        """Create the v2 client and v1.1 upload API once, on pooled keep-alive sessions"""
+        self.twitter_client = TwitterClient(
+            bearer_token=TWITTER_BEARER_TOKEN,
+            consumer_key=TWITTER_CONSUMER_KEY,
+            consumer_secret=TWITTER_CONSUMER_SECRET,
+            access_token=TWITTER_ACCESS_TOKEN,
+            access_token_secret=TWITTER_ACCESS_SECRET,
+            # Raw responses so rate-limit headers are visible on success too
+            return_type=requests.Response
+        )
+
+        auth = OAuth1UserHandler(
+            TWITTER_CONSUMER_KEY,
+            TWITTER_CONSUMER_SECRET,
+            TWITTER_ACCESS_TOKEN,
+            TWITTER_ACCESS_SECRET
+        )
+        self.legacy_api = API(auth)
+
+        for session in (self.twitter_client.session, self.legacy_api.session):
+            # One pooled connection per I/O thread; only retry failed connects,
+            # which never reached Twitter and so are safe for POSTs
+            adapter = HTTPAdapter(
+                pool_maxsize=TWITTER_IO_WORKERS,
+                max_retries=Retry(total=2, connect=2, read=0, status=0, other=0)
+            )
+            session.mount('https://', adapter)
+
+        self._last_request_at = time.monotonic()
+
+    def _check_sessions(self):
+        """Drop pooled connections that have likely been closed by Twitter while idle"""
+        with self._in_flight_lock:
+            # Closing would cut off chunked uploads still running on I/O threads
+            if self._in_flight or time.monotonic() - self._last_request_at <= KEEPALIVE_IDLE_SECONDS:
+                return
+            logger.info("Twitter connections idle too long, reopening")
+            self.twitter_client.session.close()
+            self.legacy_api.session.close()
+            self._last_request_at = time.monotonic()
+
+    async def _call_checked(self, func):
+        """Run func(); rejected credentials disable the poster instead of being retried
+
+        Credentials come from the environment, so retrying with them cannot succeed.
+        """
+        if not self.twitter_client:
+            raise TwitterUnavailable("Twitter posting is disabled")
+        self._check_sessions()
+        try:
+            return await func()
+        except Unauthorized as e:
+            logger.error(f"Twitter credentials rejected, Twitter posting disabled until restart: {str(e)}")
+            self.twitter_client = None
+            self.legacy_api = None
+            raise
+
     def process_text_for_twitter(self, text):
         """Process text for Twitter posting"""
         if not text:
@@ -64,58 +161,98 @@ class TwitterPoster:
 
         return processed_text
 
-    async def post_to_twitter(self, text, media_path=None):
-        """Post content to Twitter"""
-        try:
-            if not self.twitter_client:
-                return False
+    def prepare_text(self, text):
+        """Clean text and fit it into a single tweet"""
+        processed_text = self.process_text_for_twitter(text)
 
-            processed_text = self.process_text_for_twitter(text)
+        # Check length (280 characters for Twitter)
+        if len(processed_text) > 280:
+            logger.warning(f"Message too long for Twitter ({len(processed_text)} chars), trimming")
+            processed_text = processed_text[:277] + "..."
 
-            # Check length (280 characters for Twitter)
-            if len(processed_text) > 280:
-                logger.warning(f"Message too long for Twitter ({len(processed_text)} chars), trimming")
-                processed_text = processed_text[:277] + "..."
+        return processed_text
 
-            media_ids = []
+    async def upload_media(self, media_path=None, media_source=None):
+        """Upload a local file or a streamed media source and return its media ID"""
+        if media_source is not None:
+            media_id = await self._call_checked(lambda: self.uploader.upload_stream(
+                media_source.key,
+                media_source.size,
+                media_source.mime_type,
+                media_source.open_stream
+            ))
+        else:
+            media_id = await self._call_checked(lambda: self.uploader.upload_file(media_path))
 
-            if media_path and os.path.exists(media_path):
-                try:
-                    # Upload media using v1.1 API
-                    auth = OAuth1UserHandler(
-                        TWITTER_CONSUMER_KEY,
-                        TWITTER_CONSUMER_SECRET,
-                        TWITTER_ACCESS_TOKEN,
-                        TWITTER_ACCESS_SECRET
-                    )
+        logger.info(f"Media uploaded to Twitter, ID: {media_id}")
+        return media_id
 
-                    legacy_api = API(auth)
+    def update_rate_limit(self, headers):
+        """Remember the tweet endpoint's remaining quota and reset time"""
+        if not headers:
+            return
 
-                    # Check file size
-                    file_size = os.path.getsize(media_path) / (1024 * 1024)
-                    if file_size > 50:
-                        logger.warning(f"Media file too large ({file_size:.2f}MB)")
-                        return False
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
 
-                    media = legacy_api.media_upload(media_path)
-                    media_ids = [media.media_id]
+        # Free-tier apps also carry a per-user daily cap that outlasts the window
+        if headers.get('x-user-limit-24hour-remaining') == '0':
+            remaining = '0'
+            reset = headers.get('x-user-limit-24hour-reset', reset)
 
-                    logger.info(f"Media uploaded to Twitter, ID: {media.media_id}")
+        if remaining is not None:
+            self.rate_limit_remaining = int(remaining)
+        if reset is not None:
+            self.rate_limit_reset = int(reset)
 
-                except Exception as e:
-                    logger.error(f"Error uploading media to Twitter: {str(e)}")
-                    return False
+    def seconds_until_reset(self):
+        """How long to hold off posting, 0 if the quota is not exhausted"""
+        if self.rate_limit_remaining != 0 or not self.rate_limit_reset:
+            return 0
+        return max(0, self.rate_limit_reset - time.time())
 
-            # Post to Twitter
+    async def create_tweet(self, text, media_ids=None):
+        """Create a tweet and return its ID, tracking rate-limit headers"""
+        async def send():
             if media_ids:
-                response = self.twitter_client.create_tweet(
-                    text=processed_text,
+                return await self._run_io(
+                    self.twitter_client.create_tweet,
+                    text=text,
                     media_ids=media_ids
                 )
-            else:
-                response = self.twitter_client.create_tweet(text=processed_text)
+            return await self._run_io(self.twitter_client.create_tweet, text=text)
+
+        try:
+            response = await self._call_checked(send)
+        except TweepyException as e:
+            self.update_rate_limit(getattr(getattr(e, 'response', None), 'headers', None))
+            raise
+
+        self.update_rate_limit(response.headers)
+        tweet_id = response.json()['data']['id']
+        logger.info(f"Tweet posted successfully! ID: {tweet_id}")
+        return tweet_id
 
-            logger.info(f"Tweet posted successfully! ID: {response.data['id']}")
+    async def post_to_twitter(self, text, media_path=None, media_source=None):
+        """Post content to Twitter from a local file or a streamed media source"""
+        try:
+            if not self.twitter_client:
+                return False
+
+            processed_text = self.prepare_text(text)
+
+            media_ids = []
+
+            if media_source is not None or (media_path and os.path.exists(media_path)):
+                try:
+                    media_ids = [await self.upload_media(media_path, media_source)]
+
+                except Exception as e:
+                    logger.error(f"Error uploading media to Twitter: {str(e)}")
+                    return False
+
+            # Post to Twitter
+            await self.create_tweet(processed_text, media_ids)
             return True
 
         except TweepyException as e:
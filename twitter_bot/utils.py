@@ -71,6 +71,12 @@ class TextUtils:
         url_pattern = r'https?://[^\s]+'
         return re.findall(url_pattern, text)
 
+    @staticmethod
+    def tweet_id(url):
+        """Status ID of a Twitter/X post link, or None"""
+        match = re.search(r'(?:twitter|x)\.com/\w+/status(?:es)?/(\d+)', url)
+        return match.group(1) if match else None
+
     @staticmethod
     def remove_urls(text):
         """Remove all URLs from text"""
@@ -0,0 +1,140 @@
+"""
+Video metadata - ffprobe attributes and thumbnails for files we upload to Telegram
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg
+from telethon.tl.types import DocumentAttributeVideo
+
+from config import VIDEO_THUMB_DIR
+
+logger = logging.getLogger(__name__)
+
+# Telegram only shows JPEG thumbnails up to 320px on the long side
+THUMB_BOX = 320
+THUMB_OFFSET = 1.0
+MAX_CACHED_VIDEOS = 256
+
+
+def _rotation(stream):
+    """Display rotation in degrees from the rotate tag or the display matrix"""
+    rotation = stream.get('tags', {}).get('rotate')
+    if rotation is None:
+        rotation = next(
+            (data.get('rotation') for data in stream.get('side_data_list', []) if 'rotation' in data), 0
+        )
+    try:
+        return int(float(rotation)) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+def probe_video(source_path, thumb_path):
+    """Read duration and display size and write a JPEG thumbnail (blocking)
+
+    Returns a dict with duration, width, height and thumb (None if no frame could be grabbed).
+    """
+    probe = ffmpeg.probe(source_path)
+    video = next(s for s in probe['streams'] if s['codec_type'] == 'video')
+    duration = float(probe['format'].get('duration') or video.get('duration') or 0)
+    width, height = int(video.get('width', 0)), int(video.get('height', 0))
+    if _rotation(video) in (90, 270):
+        width, height = height, width
+
+    # Grab the frame a second in, unless the clip is shorter than that
+    offset = min(THUMB_OFFSET, duration / 2)
+    tmp_path = f"{thumb_path}.part.jpg"
+    try:
+        (
+            ffmpeg
+            .input(source_path, ss=offset)
+            .filter('scale', THUMB_BOX, THUMB_BOX, force_original_aspect_ratio='decrease')
+            .output(tmp_path, vframes=1, q=4)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+        os.replace(tmp_path, thumb_path)
+        thumb = thumb_path
+    except (ffmpeg.Error, OSError) as e:
+        logger.warning(f"Could not extract thumbnail from {source_path}: {e}")
+        thumb = None
+
+    return {'duration': duration, 'width': width, 'height': height, 'thumb': thumb}
+
+
+class VideoMetadata:
+    """ffprobe results and thumbnails cached per file, for explicit video attributes on send"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ffprobe")
+
+    @staticmethod
+    def _key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    async def get(self, path):
+        """Metadata for a local video file, probing it at most once per version"""
+        key = self._key(path)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        future = self._inflight.get(key)
+        if future is None:
+            os.makedirs(VIDEO_THUMB_DIR, exist_ok=True)
+            name = hashlib.sha1(repr(key).encode()).hexdigest()
+            thumb_path = os.path.join(VIDEO_THUMB_DIR, f"{name}.jpg")
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, probe_video, path, thumb_path)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        meta = await asyncio.shield(future)
+        self._store(key, meta)
+        return meta
+
+    def _store(self, key, meta):
+        if key in self._entries:
+            return
+        self._entries[key] = meta
+        while len(self._entries) > MAX_CACHED_VIDEOS:
+            _, old = self._entries.popitem(last=False)
+            if old['thumb']:
+                try:
+                    os.remove(old['thumb'])
+                except OSError:
+                    pass
+
+    async def send_options(self, userbot, path):
+        """send_file keyword arguments for an uploaded video: attributes, thumbnail, streaming"""
+        try:
+            meta = await self.get(path)
+        except Exception as e:
+            logger.warning(f"Could not probe video {path}, sending without metadata: {e}")
+            return {}
+
+        options = {
+            'mime_type': 'video/mp4',
+            'supports_streaming': True,
+            'attributes': [DocumentAttributeVideo(
+                duration=round(meta['duration']),
+                w=meta['width'],
+                h=meta['height'],
+                supports_streaming=True
+            )],
+        }
+        if meta['thumb']:
+            # Uploaded once so every channel send reuses it
+            options['thumb'] = await userbot.upload_file(meta['thumb'])
+        return options
@@ -0,0 +1,202 @@
+"""
+Watermark - Logo overlay for photos posted to the channels
+"""
+
+import asyncio
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg
+import numpy as np
+from PIL import Image
+
+from config import (
+    WATERMARK_LOGO_PATH, WATERMARK_POSITION, WATERMARK_OPACITY, WATERMARK_ENABLED,
+    WATERMARK_WORKERS, WATERMARK_CACHE_DIR, WATERMARK_CACHE_MB
+)
+from .transcoder import prune_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Logo height as a fraction of the target's height, and edge margin as a fraction of its short side
+LOGO_HEIGHT_RATIO = 0.12
+MARGIN_RATIO = 0.03
+MAX_CACHED_VARIANTS = 32
+
+
+def logo_position(position, width, height, logo_width, logo_height, margin):
+    """Top-left corner of the logo for a WATERMARK_POSITION value"""
+    if position == 'center':
+        return (width - logo_width) // 2, (height - logo_height) // 2
+
+    x = margin if position.endswith('left') else width - logo_width - margin
+    y = margin if position.startswith('top') else height - logo_height - margin
+    return max(0, x), max(0, y)
+
+
+def overlay_position(position):
+    """overlay filter x/y expressions matching logo_position()"""
+    # min(W, H) written without a comma, which would split the filtergraph
+    margin = f"(main_w+main_h-abs(main_w-main_h))*{MARGIN_RATIO / 2}"
+    if position == 'center':
+        return '(main_w-overlay_w)/2', '(main_h-overlay_h)/2'
+
+    x = margin if position.endswith('left') else f"main_w-overlay_w-{margin}"
+    y = margin if position.startswith('top') else f"main_h-overlay_h-{margin}"
+    return x, y
+
+
+def watermark_video_job(source_path, output_path, logo_path, position, opacity):
+    """Burn the logo into a video in one ffmpeg pass (runs in a worker process)
+
+    The logo is scaled against the video height with scale2ref, faded with
+    colorchannelmixer and overlaid; audio is copied without re-encoding.
+    """
+    probe = ffmpeg.probe(source_path)
+    has_audio = any(s['codec_type'] == 'audio' for s in probe['streams'])
+
+    source = ffmpeg.input(source_path)
+    logo = (
+        ffmpeg.input(logo_path)
+        .filter('format', 'rgba')
+        .filter('colorchannelmixer', aa=round(opacity / 255, 3))
+    )
+    scaled = ffmpeg.filter_multi_output([logo, source.video], 'scale2ref', w='oh*mdar', h=f'ih*{LOGO_HEIGHT_RATIO}')
+    x, y = overlay_position(position)
+    video = ffmpeg.overlay(scaled[1], scaled[0], x=x, y=y, format='auto')
+    streams = [video, source.audio] if has_audio else [video]
+
+    audio_options = {'acodec': 'copy'} if has_audio else {}
+    tmp_path = f"{output_path}.part.mp4"
+    (
+        ffmpeg
+        .output(
+            *streams,
+            tmp_path,
+            vcodec='libx264',
+            preset='veryfast',
+            crf=20,
+            pix_fmt='yuv420p',
+            movflags='+faststart',
+            **audio_options
+        )
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class ImageWatermarker:
+    """Composite the channel logo onto photos with NumPy, off the event loop"""
+
+    def __init__(self):
+        self._logo = None
+        self._variants = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=WATERMARK_WORKERS, thread_name_prefix="watermark")
+        self.enabled = WATERMARK_ENABLED and self._load_logo()
+
+    def _load_logo(self):
+        """Load the logo once with WATERMARK_OPACITY folded into its alpha"""
+        if not os.path.exists(WATERMARK_LOGO_PATH):
+            logger.warning(f"Watermark logo {WATERMARK_LOGO_PATH} not found, watermarking disabled")
+            return False
+
+        logo = Image.open(WATERMARK_LOGO_PATH).convert('RGBA')
+        alpha = np.asarray(logo.getchannel('A'), dtype=np.float32) * (WATERMARK_OPACITY / 255.0)
+        logo.putalpha(Image.fromarray(alpha.round().astype(np.uint8)))
+        self._logo = logo
+        logger.info(f"Watermark logo loaded ({logo.width}x{logo.height}, position {WATERMARK_POSITION})")
+        return True
+
+    def _variant(self, width, height):
+        """Pre-multiplied logo scaled for a target resolution, cached per size"""
+        key = (width, height)
+        with self._lock:
+            variant = self._variants.get(key)
+        if variant is not None:
+            return variant
+
+        logo_height = max(1, int(height * LOGO_HEIGHT_RATIO))
+        logo_width = max(1, int(self._logo.width * logo_height / self._logo.height))
+        scaled = np.asarray(
+            self._logo.resize((logo_width, logo_height), Image.LANCZOS), dtype=np.float32
+        ) / 255.0
+
+        alpha = scaled[..., 3:4]
+        premultiplied = scaled[..., :3] * alpha
+        margin = int(min(width, height) * MARGIN_RATIO)
+        x, y = logo_position(WATERMARK_POSITION, width, height, logo_width, logo_height, margin)
+
+        variant = (premultiplied * 255.0, 1.0 - alpha, x, y)
+        with self._lock:
+            if len(self._variants) >= MAX_CACHED_VARIANTS:
+                self._variants.pop(next(iter(self._variants)))
+            self._variants[key] = variant
+        return variant
+
+    def apply(self, image):
+        """Return a copy of a PIL image with the logo composited on it"""
+        base = np.array(image.convert('RGB'), dtype=np.float32)
+        height, width = base.shape[:2]
+        logo, inverse_alpha, x, y = self._variant(width, height)
+
+        # Clip the logo to the image for targets smaller than the logo itself
+        logo_height = min(logo.shape[0], height - y)
+        logo_width = min(logo.shape[1], width - x)
+        region = base[y:y + logo_height, x:x + logo_width]
+        region *= inverse_alpha[:logo_height, :logo_width]
+        region += logo[:logo_height, :logo_width]
+
+        return Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+
+    def apply_bytes(self, data, quality=92):
+        """Watermark encoded image bytes and return JPEG bytes"""
+        with Image.open(io.BytesIO(data)) as image:
+            result = self.apply(image)
+
+        output = io.BytesIO()
+        result.save(output, format='JPEG', quality=quality)
+        return output.getvalue()
+
+    async def watermark_bytes(self, data):
+        """Watermark image bytes in the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.apply_bytes, data)
+
+
+class VideoWatermarker:
+    """Watermark videos in the transcoder's process pool, once per Telegram media ID"""
+
+    def __init__(self, transcoder):
+        self.transcoder = transcoder
+        self._inflight = {}
+        self.enabled = WATERMARK_ENABLED and os.path.exists(WATERMARK_LOGO_PATH)
+
+    async def prepare(self, key, source_path):
+        """Return the path of the watermarked copy of source_path"""
+        output_path = os.path.join(WATERMARK_CACHE_DIR, f"{key}.mp4")
+        if os.path.exists(output_path):
+            logger.info(f"Using cached watermarked video {key}")
+            os.utime(output_path)
+            return output_path
+
+        # Both channels ask for the same media; encode it only once
+        future = self._inflight.get(key)
+        if future is None:
+            os.makedirs(WATERMARK_CACHE_DIR, exist_ok=True)
+            future = asyncio.ensure_future(self.transcoder.submit(
+                watermark_video_job, source_path, output_path,
+                WATERMARK_LOGO_PATH, WATERMARK_POSITION, WATERMARK_OPACITY
+            ))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        result = await asyncio.shield(future)
+        logger.info(f"Watermarked video {key} ({os.path.getsize(result) / (1024 * 1024):.2f}MB)")
+        prune_cache_dir(WATERMARK_CACHE_DIR, WATERMARK_CACHE_MB * 1024 * 1024)
+        return result